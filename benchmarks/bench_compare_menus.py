@@ -0,0 +1,108 @@
+"""메뉴 diff 엔진이 메뉴 개수에 따라 어떻게 늘어나는지 측정한다.
+
+python3 benchmarks/bench_compare_menus.py [--sizes 1000 2000 4000] [--legacy-max 4000]
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from itertools import compress
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from menu_diff import diff_menus, index_menus  # pylint: disable=wrong-import-position
+
+
+def legacy_compare(db_menus, crawled_menus):
+    # 기존 handler.compare_menus / remove_duplicate의 O(n*m) 구현
+    unique_fields = ["restaurant_id", "code", "date", "type"]
+    detail_fields = ["price", "etc"]
+    unique = [True] * len(crawled_menus)
+    for i in range(len(crawled_menus)):
+        for j in range(i):
+            if all((crawled_menus[i].get(field) == crawled_menus[j].get(field)) for field in unique_fields):
+                unique[i] = False
+                break
+    crawled_menus = list(compress(crawled_menus, unique))
+
+    db_not_found = [True] * len(db_menus)
+    crawled_not_found = [True] * len(crawled_menus)
+    edited = [False] * len(db_menus)
+    for db_idx in range(len(db_menus)):
+        for crawled_idx in range(len(crawled_menus)):
+            if all((db_menus[db_idx].get(field) == crawled_menus[crawled_idx].get(field)) for field in unique_fields):
+                db_not_found[db_idx] = False
+                crawled_not_found[crawled_idx] = False
+                for field in detail_fields:
+                    if db_menus[db_idx].get(field) != crawled_menus[crawled_idx].get(field):
+                        edited[db_idx] = True
+                        db_menus[db_idx]["previous_" + field] = db_menus[db_idx].pop(field, None)
+                        db_menus[db_idx][field] = crawled_menus[crawled_idx].get(field)
+                break
+    return (
+        list(compress(crawled_menus, crawled_not_found)),
+        list(compress(db_menus, db_not_found)),
+        list(compress(db_menus, edited)),
+    )
+
+
+def make_menus(size, seed=0):
+    # 식당 13곳 x 3끼 x 날짜 기준의 가짜 메뉴. DB 쪽은 일부가 빠지거나, 가격이 다르거나, 사라진 메뉴다.
+    rng = random.Random(seed)
+    start = datetime.date(2023, 1, 1)
+    crawled = []
+    for i in range(size):
+        crawled.append(
+            dict(
+                restaurant_id=i % 13 + 1,
+                code=f"메뉴{i // 39}",
+                date=start + datetime.timedelta(days=i // 39 % 30),
+                type=("BR", "LU", "DN")[i % 3],
+                name_kr=f"메뉴 {i // 39}",
+                price=rng.choice([None, 4000, 5000]),
+                etc="[]",
+            )
+        )
+    db = []
+    for i, menu in enumerate(crawled):
+        if rng.random() < 0.05:
+            continue
+        row = dict(menu, id=i)
+        roll = rng.random()
+        if roll < 0.05:
+            row["price"] = 3000
+        elif roll < 0.08:
+            row["code"] = f"사라진메뉴{i}"
+        db.append(row)
+    return db, crawled
+
+
+def measure(func, size):
+    db, crawled = make_menus(size)
+    started = time.perf_counter()
+    result = func(db, crawled)
+    return time.perf_counter() - started, [len(menus) for menus in result]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare_menus micro-benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000, 16000, 32000])
+    parser.add_argument("--legacy-max", type=int, default=2000, help="이 크기까지만 기존 구현도 측정")
+    args = parser.parse_args()
+
+    print(f"{'menus':>8} {'indexed(ms)':>12} {'legacy(ms)':>12}  new/deleted/edited")
+    for size in args.sizes:
+        elapsed, counts = measure(lambda db, crawled: diff_menus(db, index_menus(crawled)), size)
+        legacy = "-"
+        if size <= args.legacy_max:
+            legacy_elapsed, legacy_counts = measure(legacy_compare, size)
+            assert legacy_counts == counts, (legacy_counts, counts)
+            legacy = f"{legacy_elapsed * 1000:.1f}"
+        print(f"{size:>8} {elapsed * 1000:>12.2f} {legacy:>12}  {'/'.join(map(str, counts))}")
+
+
+if __name__ == "__main__":
+    main()
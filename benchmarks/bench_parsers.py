@@ -0,0 +1,46 @@
+"""녹화된 페이지로 파서 백엔드(html.parser, lxml)와 SoupStrainer 적용 여부별 파싱 속도를 비교한다.
+
+python3 benchmarks/bench_parsers.py [--repeat 50]
+"""
+
+import argparse
+import importlib.util
+import time
+
+from common import MENU_FIXTURES, crawl_kwargs, parse_fixture
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    if importlib.util.find_spec("lxml"):
+        parsers.append("lxml")
+    return parsers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="parser backend benchmark")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'fixture':<20} {'backend':<12} {'strained':<9} {'pages/s':>9} {'meals':>6}")
+    for name, crawler_cls in MENU_FIXTURES:
+        kwargs = crawl_kwargs(crawler_cls)
+        expected = None
+        for backend in available_parsers():
+            for strained in (False, True):
+                meals = parse_fixture(name, crawler_cls, backend, strained, **kwargs)
+                output = [str(meal) for meal in meals]
+                # 백엔드/strainer와 상관없이 결과가 같아야 한다
+                if expected is None:
+                    expected = output
+                assert output == expected, f"{name}: {backend}, strained={strained} differs from html.parser"
+
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    parse_fixture(name, crawler_cls, backend, strained, **kwargs)
+                elapsed = time.perf_counter() - started
+                print(f"{name:<20} {backend:<12} {str(strained):<9} {args.repeat / elapsed:>9.1f} {len(meals):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import datetime
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT_DIR, "benchmarks", "fixtures")
+sys.path.insert(0, ROOT_DIR)
+
+# pylint: disable=wrong-import-position
+from crawlers.base_crawler import make_soup
+from crawlers.snuco_crawler import SnucoRestaurantCrawler
+from crawlers.snudorm_crawler import SnudormRestaurantCrawler
+from crawlers.vet_crawler import VetRestaurantCrawler
+
+# 녹화된 페이지: (fixture 이름, 크롤러 클래스, 원본 URL, HTTP method, POST data)
+SNUCO_DATE = datetime.date(2024, 5, 14)
+FIXTURES = [
+    (
+        "snuco.html",
+        SnucoRestaurantCrawler,
+        SnucoRestaurantCrawler.url + f"?date={SNUCO_DATE.isoformat()}",
+        "GET",
+        None,
+    ),
+    (
+        "snudorm_week.html",
+        SnudormRestaurantCrawler,
+        SnudormRestaurantCrawler.url,
+        "POST",
+        {"action": "metapresso_dorm_food_week_list", "start_week_date": "2024-05-13", "target_blog": "39"},
+    ),
+    ("snudorm_menucost.html", SnudormRestaurantCrawler, SnudormRestaurantCrawler.menucost_url, "GET", None),
+    ("vet.html", VetRestaurantCrawler, VetRestaurantCrawler.url, "GET", None),
+]
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+        return f.read()
+
+
+def menucosts(parser=None):
+    return SnudormRestaurantCrawler().parse_menucosts(load_fixture("snudorm_menucost.html"), parser)
+
+
+def crawl_kwargs(crawler_cls):
+    if crawler_cls is SnucoRestaurantCrawler:
+        return dict(date=SNUCO_DATE)
+    if crawler_cls is SnudormRestaurantCrawler:
+        return dict(menucosts=menucosts())
+    return {}
+
+
+def parse_fixture(name, crawler_cls, parser=None, strained=True, **kwargs):
+    crawler = crawler_cls()
+    soup = make_soup(load_fixture(name), crawler.parse_only if strained else None, parser)
+    crawler.crawl(soup, **kwargs)
+    return crawler.meals
+
+
+# 식단 페이지 (Snudorm 가격표 페이지는 crawl() 대상이 아니다)
+MENU_FIXTURES = [(name, crawler_cls) for name, crawler_cls, *_ in FIXTURES if name != "snudorm_menucost.html"]
@@ -0,0 +1,58 @@
+"""`python -X importtime`으로 handler.py의 import 시간을 재고 예산을 넘거나 무거운 모듈을 미리 불러오면 실패한다.
+
+python3 benchmarks/import_budget.py                 # 기본 예산(150ms)과 비교 (넘으면 exit code 1)
+python3 benchmarks/import_budget.py --budget-ms 100
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# handler를 import하는 것만으로는 불러오지 않아야 하는 모듈 (DB, HTTP, HTML 파싱은 쓰는 경로에서 불러온다)
+LAZY_MODULES = ("pymysql", "aiohttp", "bs4", "lxml", "requests", "urllib3", "crawlers.base_crawler")
+
+
+def measure(module):
+    # 새 인터프리터에서 module을 import하고 (누적 시간(us), 모듈별 누적 시간)을 돌려준다
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        imports[name.strip()] = int(cumulative)
+    return imports[module], imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="handler import time budget")
+    parser.add_argument("--module", default="handler")
+    parser.add_argument("--budget-ms", type=float, default=150)
+    parser.add_argument("--runs", type=int, default=5, help="가장 빠른 실행으로 비교한다 (디스크 캐시 등의 잡음 제거)")
+    parser.add_argument("--top", type=int, default=10, help="누적 시간이 큰 모듈을 이만큼 보여준다")
+    args = parser.parse_args()
+
+    total, imports = min((measure(args.module) for _ in range(args.runs)), key=lambda measured: measured[0])
+    print(f"{'module':<50} {'cumulative(ms)':>14}")
+    for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{name:<50} {cumulative / 1000:>14.1f}")
+
+    print(f"import {args.module} took {total / 1000:.1f}ms (budget {args.budget_ms:.0f}ms)")
+    eager = [name for name in LAZY_MODULES if name in imports and name != args.module]
+    if eager:
+        print(f"Imported eagerly by {args.module}: {', '.join(eager)}")
+    if eager or total / 1000 > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
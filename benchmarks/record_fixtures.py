@@ -0,0 +1,27 @@
+"""실제 사이트에서 벤치마크용 페이지(benchmarks/fixtures)를 다시 녹화한다.
+
+python3 benchmarks/record_fixtures.py
+"""
+
+import asyncio
+import os
+
+from common import FIXTURE_DIR, FIXTURES
+
+from crawlers.base_crawler import RestaurantCrawler
+from crawlers.http_client import HttpClient
+
+
+async def record():
+    async with HttpClient(RestaurantCrawler.headers) as client:
+        for name, _, url, method, data in FIXTURES:
+            body = await client.fetch(url, method, data)
+            if body is None:
+                continue
+            with open(os.path.join(FIXTURE_DIR, name), "wb") as f:
+                f.write(body)
+            print(f"Recorded {name} ({len(body)} bytes) from {url}")
+
+
+if __name__ == "__main__":
+    asyncio.run(record())
@@ -0,0 +1,163 @@
+"""녹화된 페이지로 크롤러 파싱, 정규화, compare_menus 속도를 재고 저장된 기준값과 비교한다.
+
+python3 benchmarks/run_benchmarks.py                  # 기준값과 비교 (느려졌으면 exit code 1)
+python3 benchmarks/run_benchmarks.py --save-baseline  # 현재 결과를 기준값으로 저장
+
+한 번 잰 처리량은 실행마다 30% 가까이 흔들리므로, 전체 측정을 --repeat번 반복한 중앙값을 쓴다.
+"""
+
+import argparse
+import copy
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from common import MENU_FIXTURES, crawl_kwargs, load_fixture, parse_fixture
+
+from crawlers.base_crawler import make_soup, text_normalizer
+from crawlers.snudorm_crawler import SnudormRestaurantCrawler
+from handler import compare_menus
+from restaurant_registry import RestaurantRegistry
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def measure(func, min_time):
+    # min_time 이상 반복 실행해 1회당 평균 시간을 구한다
+    func()
+    count = 0
+    started = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return elapsed / count
+
+
+def normalizer_inputs(name, crawler_cls, kwargs):
+    # 페이지를 한 번 파싱하면서 normalize()에 들어가는 (정규화 전) 식단과 인자를 모은다
+    crawler = crawler_cls()
+    inputs = []
+    normalize = crawler.normalize
+
+    def recording_normalize(meal, **normalize_kwargs):
+        inputs.append((copy.deepcopy(meal), normalize_kwargs))
+        return normalize(meal, **normalize_kwargs)
+
+    crawler.normalize = recording_normalize
+    crawler.crawl(make_soup(load_fixture(name), crawler.parse_only), **kwargs)
+    return crawler_cls(), inputs
+
+
+def compare_menus_inputs(days=30):
+    # 녹화된 식단을 days일치로 늘리고, DB 쪽은 일부를 지우거나 가격을 바꿔 둔다
+    meals = []
+    for name, crawler_cls in MENU_FIXTURES:
+        meals += parse_fixture(name, crawler_cls, **crawl_kwargs(crawler_cls))
+    crawled = []
+    for offset in range(days):
+        for meal in meals:
+            shifted = copy.copy(meal)
+            shifted.date = meal.date + datetime.timedelta(days=offset)
+            crawled.append(shifted)
+
+    codes = sorted({text_normalizer(meal.restaurant, True) for meal in crawled})
+    restaurants = [dict(id=i + 1, code=code) for i, code in enumerate(codes)]
+    restaurant_ids = {restaurant["code"]: restaurant["id"] for restaurant in restaurants}
+    db_menus = []
+    for i, meal in enumerate(crawled):
+        if i % 20 == 0:
+            continue
+        menu = meal.as_dict()
+        restaurant = menu.pop("restaurant")
+        name = menu.pop("name")
+        menu.update(
+            id=i,
+            restaurant_id=restaurant_ids[text_normalizer(restaurant, True)],
+            code=text_normalizer(name, True),
+            name_kr=name,
+        )
+        if i % 20 == 1:
+            menu["price"] = 1000
+        if i % 20 == 2:
+            menu["code"] += "삭제"
+        db_menus.append(menu)
+    return db_menus, crawled, RestaurantRegistry(restaurants)
+
+
+def run(min_time):
+    results = {}
+    for name, crawler_cls in MENU_FIXTURES:
+        kwargs = crawl_kwargs(crawler_cls)
+        meal_count = len(parse_fixture(name, crawler_cls, **kwargs))
+        seconds = measure(lambda: parse_fixture(name, crawler_cls, **kwargs), min_time)
+        results[f"crawl/{name}/pages_per_sec"] = 1 / seconds
+        results[f"crawl/{name}/meals_per_sec"] = meal_count / seconds
+
+        crawler, inputs = normalizer_inputs(name, crawler_cls, kwargs)
+        if inputs:
+
+            def normalize_all():
+                for meal, normalize_kwargs in inputs:
+                    # normalize()가 식단을 바꾸므로 복사본을 넘긴다 (etc 리스트도 새로)
+                    fresh = copy.copy(meal)
+                    fresh.etc = list(meal.etc)
+                    crawler.normalize(fresh, **normalize_kwargs)
+
+            results[f"normalize/{name}/meals_per_sec"] = len(inputs) / measure(normalize_all, min_time)
+
+    menucost_html = load_fixture("snudorm_menucost.html")
+    seconds = measure(lambda: SnudormRestaurantCrawler().parse_menucosts(menucost_html), min_time)
+    results["crawl/snudorm_menucost.html/pages_per_sec"] = 1 / seconds
+
+    db_menus, crawled, restaurants = compare_menus_inputs()
+    seconds = measure(lambda: compare_menus(copy.deepcopy(db_menus), crawled, restaurants), min_time)
+    results["compare_menus/30days/menus_per_sec"] = len(crawled) / seconds
+    return results
+
+
+def median_results(runs):
+    return {key: statistics.median(results[key] for results in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline crawler benchmark suite")
+    parser.add_argument("--min-time", type=float, default=0.5, help="항목마다 최소 측정 시간(초)")
+    parser.add_argument("--repeat", type=int, default=5, help="전체 측정 반복 횟수 (항목마다 중앙값을 쓴다)")
+    parser.add_argument("--tolerance", type=float, default=0.4, help="기준값보다 이 비율 이상 느리면 regression")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    results = median_results([run(args.min_time) for _ in range(max(args.repeat, 1))])
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f"{'benchmark':<50} {'current':>12} {'baseline':>12} {'change':>8}")
+    for key, value in results.items():
+        base = baseline.get(key)
+        change = f"{(value / base - 1) * 100:+.1f}%" if base else "-"
+        print(f"{key:<50} {value:>12.1f} {base or 0:>12.1f} {change:>8}")
+        # 모든 항목은 클수록 좋은 처리량이다
+        if base and value < base * (1 - args.tolerance):
+            regressions.append(key)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+    elif regressions:
+        print(f"Regressions (> {args.tolerance:.0%} slower): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import importlib
+
+# 크롤러 이름 -> "모듈:클래스". 크롤러 모듈은 bs4, aiohttp를 함께 불러와 무거우므로 실제로 쓸 때 불러온다.
+CRAWLER_PATHS = {
+    "vet": "crawlers.vet_crawler:VetRestaurantCrawler",
+    "snudorm": "crawlers.snudorm_crawler:SnudormRestaurantCrawler",
+    "snuco": "crawlers.snuco_crawler:SnucoRestaurantCrawler",
+}
+
+
+def get_crawler_class(name):
+    module_name, class_name = CRAWLER_PATHS[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def crawler_classes(names=None):
+    return [get_crawler_class(name) for name in names or CRAWLER_PATHS]
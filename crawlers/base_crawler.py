@@ -1,45 +1,100 @@
+import asyncio
 import datetime
+import functools
+import importlib.util
 import json
+import os
 import re
+import time
 from abc import ABCMeta, abstractmethod
 
-import aiohttp
-import urllib3
-from bs4 import BeautifulSoup
-from pytz import timezone
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from crawlers.clock import get_run_clock, set_run_clock
+from crawlers.fingerprint import page_digest
+from crawlers.http_client import HttpClient, RequestPolicy
+from crawlers.metrics import metrics
+
+
+def default_parser():
+    # CRAWLER_PARSER로 지정하지 않으면 lxml이 설치된 경우 lxml, 아니면 html.parser를 쓴다
+    parser = os.environ.get("CRAWLER_PARSER")
+    if parser:
+        return parser
+    return "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+PARSER = default_parser()
+
+
+def make_soup(html, parse_only=None, parser=None):
+    try:
+        return BeautifulSoup(html, parser or PARSER, parse_only=parse_only)
+    except FeatureNotFound:
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+
+NON_LETTERS = re.compile(
+    "|".join(
+        [
+            r"\s",
+            "<",
+            ">",
+            r"\(",
+            r"\)",
+            r"\[",
+            r"\]",
+            ",",
+            r"\*",
+            "&",
+            r"\+",
+            "-",
+            r"/",
+            ":",
+            "#",
+            r"\.",
+            "♣",
+            "▷",
+            "ㅁ",
+            "~",
+        ]
+    )
+)
+EMPTY_MARKS = re.compile(r"\n|\(\)|<>")
+DATE_NUMBERS = re.compile(r"\d{1,2}")
+NON_DIGITS = re.compile(r"\D")
 
 
 def text_normalizer(text, only_letters=False):
-    non_letters = [
-        r"\s",
-        "<",
-        ">",
-        r"\(",
-        r"\)",
-        r"\[",
-        r"\]",
-        ",",
-        r"\*",
-        "&",
-        r"\+",
-        "-",
-        r"/",
-        ":",
-        "#",
-        r"\.",
-        "♣",
-        "▷",
-        "ㅁ",
-        "~",
-    ]
-    text = re.sub(r"\n|\(\)|<>", "", text).strip().strip(":")
-    text = re.sub(r"\xa0", " ", text)
+    # 대부분의 문자열에는 지울 표시가 없으므로 그때는 정규식을 건너뛴다 (결과는 같다)
+    if "\n" in text or "()" in text or "<>" in text:
+        text = EMPTY_MARKS.sub("", text)
+    text = text.strip().strip(":")
+    if "\xa0" in text:
+        text = text.replace("\xa0", " ")
     if only_letters:
-        text = re.sub("|".join(non_letters), "", text)
+        text = NON_LETTERS.sub("", text)
     return text
 
 
+@functools.lru_cache(maxsize=256)
+def normalize_meal_type(type):
+    return Meal.type_handler.get(text_normalizer(type, True))
+
+
+def parse_date(date):
+    # date 객체나 "05/13(월)"처럼 월, 일 숫자가 들어 있는 문자열 (연도는 기준 시각의 연도)
+    if isinstance(date, datetime.date):
+        return date
+    nums = DATE_NUMBERS.findall(date)
+    month = int(nums[0])
+    day = int(nums[1])
+    return datetime.date(get_run_clock().year, month, day)
+
+
 class Meal:
+    __slots__ = ("_restaurant", "_name", "date", "type", "price", "etc", "_code", "_restaurant_code")
+
     BR = "BR"
     LU = "LU"
     DN = "DN"
@@ -65,6 +120,37 @@ class Meal:
         self.set_price(price)
         self.set_etc(etc)
 
+    # restaurant, name이 바뀌면 캐시해 둔 code를 버린다
+    @property
+    def restaurant(self):
+        return self._restaurant
+
+    @restaurant.setter
+    def restaurant(self, restaurant):
+        self._restaurant = restaurant
+        self._restaurant_code = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+        self._code = None
+
+    @property
+    def code(self):
+        if self._code is None:
+            self._code = text_normalizer(self._name, True)
+        return self._code
+
+    @property
+    def restaurant_code(self):
+        if self._restaurant_code is None:
+            self._restaurant_code = text_normalizer(self._restaurant, True)
+        return self._restaurant_code
+
     def set_restaurant(self, restaurant):
         self.restaurant = text_normalizer(restaurant)
 
@@ -73,19 +159,11 @@ class Meal:
 
     def set_date(self, date=None):
         if not date:
-            now = datetime.datetime.now(timezone("Asia/Seoul"))
-            date = datetime.date.fromtimestamp(now.timestamp())
-        if isinstance(date, datetime.date):
-            self.date = date
-        else:
-            year = datetime.datetime.now(timezone("Asia/Seoul")).year
-            nums = re.findall(r"\d{1,2}", date)
-            month = int(nums[0])
-            day = int(nums[1])
-            self.date = datetime.date(year, month, day)
+            date = get_run_clock().local_date
+        self.date = parse_date(date)
 
     def set_type(self, type):
-        self.type = self.type_handler.get(text_normalizer(type, True))
+        self.type = normalize_meal_type(type)
 
     def set_price(self, price):
         if isinstance(price, int):
@@ -94,11 +172,18 @@ class Meal:
             if not price:
                 self.price = None
             else:
-                self.price = int(re.sub(r"\D", "", price))
+                self.price = int(NON_DIGITS.sub("", price))
 
     def set_etc(self, etc):
         self.etc = etc if etc else []
 
+    def __copy__(self):
+        # __slots__ 객체의 기본 copy.copy는 __reduce_ex__를 거쳐 느리므로 필드를 직접 옮긴다
+        meal = type(self).__new__(type(self))
+        for slot in self.__slots__:
+            setattr(meal, slot, getattr(self, slot))
+        return meal
+
     def __str__(self):
         return f"{self.type}> {self.name} | {self.restaurant} | {self.date.isoformat()} | {self.price} | {repr(', '.join(self.etc))}"
 
@@ -109,23 +194,96 @@ class Meal:
             date=self.date,
             type=self.type,
             price=self.price,
-            etc=json.dumps(self.etc),
+            etc=json.dumps(self.etc) if self.etc else "[]",
         )
 
+    def as_menu(self, restaurant_id):
+        # menu 테이블 행 모양 (handler.compare_menus에서 DB 메뉴와 비교한다)
+        return dict(
+            date=self.date,
+            type=self.type,
+            price=self.price,
+            etc=json.dumps(self.etc) if self.etc else "[]",
+            restaurant_id=restaurant_id,
+            name_kr=self.name,
+            code=self.code,
+        )
+
+    def as_record(self):
+        return [self.restaurant, self.name, self.date.isoformat(), self.type, self.price, self.etc]
+
+    @classmethod
+    def from_record(cls, record):
+        # as_record()로 만든 값은 이미 정규화되어 있으므로 setter를 거치지 않는다
+        meal = cls.__new__(cls)
+        meal.restaurant, meal.name, date, meal.type, meal.price, etc = record
+        meal.date = datetime.date.fromisoformat(date)
+        meal.etc = list(etc)
+        return meal
+
 
 class MealNormalizer(metaclass=ABCMeta):
+    # 크롤러 클래스마다 한 번만 만들어 모든 식단에 다시 쓰므로 상태를 가지면 안 된다
     @abstractmethod
     def normalize(self, meal, **kwargs):
         pass
 
 
+class NameRewriter(MealNormalizer):
+    """식단 이름만 바꾸는 정규화. 연속된 NameRewriter는 NormalizerPipeline에서 한 단계로 합친다."""
+
+    def normalize(self, meal, **kwargs):
+        meal.name = self.rewrite_name(meal.name)
+        return meal
+
+    @abstractmethod
+    def rewrite_name(self, name):
+        # 정규화된 이름을 받아 set_name()을 거친 것과 같은 이름을 돌려준다
+        pass
+
+
+class FusedNameRewriter(MealNormalizer):
+    def __init__(self, rewriters):
+        self.rewriters = rewriters
+
+    def normalize(self, meal, **kwargs):
+        name = meal.name
+        for rewriter in self.rewriters:
+            name = rewriter.rewrite_name(name)
+        meal.name = name
+        return meal
+
+
+class NormalizerPipeline:
+    """normalizer_classes를 한 번 인스턴스화해 순서대로 적용한다."""
+
+    def __init__(self, normalizer_classes):
+        self.steps = []
+        for normalizer_cls in normalizer_classes:
+            normalizer = normalizer_cls()
+            if isinstance(normalizer, NameRewriter):
+                if self.steps and isinstance(self.steps[-1], FusedNameRewriter):
+                    self.steps[-1].rewriters.append(normalizer)
+                    continue
+                normalizer = FusedNameRewriter([normalizer])
+            self.steps.append(normalizer)
+
+    def normalize(self, meal, **kwargs):
+        # 단계마다 set_name()으로 정규화한다. 다음 단계는 정규화된 이름을 보고 판단한다
+        # (예: FindPrice가 가격을 지운 뒤 남은 ":"가 지워져야 FindParenthesisHash가 "< 채식뷔페 >:"로 보지 않는다).
+        for step in self.steps:
+            meal = step.normalize(meal, **kwargs)
+        return meal
+
+
 class FindPrice(MealNormalizer):
+    price_pattern = re.compile(r"([1-9]\d{0,2}[,.]?\d00)(.*?원)?")
+
     def normalize(self, meal, **kwargs):
-        p = re.compile(r"([1-9]\d{0,2}[,.]?\d00)(.*?원)?")
-        m = p.search(meal.name)
+        m = self.price_pattern.search(meal.name)
         if m:
             meal.set_price(m.group(1))
-            meal.set_name(p.sub("", meal.name))
+            meal.set_name(self.price_pattern.sub("", meal.name))
         return meal
 
 
@@ -141,7 +299,22 @@ class FindParenthesisHash(MealNormalizer):
 class RestaurantCrawler(metaclass=ABCMeta):
     headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:57.0) Gecko/20100101 Firefox/57.0"}
     url = ""
+    # 이 크롤러가 요청하는 호스트의 동시 요청 수, 초당 요청 수, 재시도 설정
+    request_policy = RequestPolicy()
     normalizer_classes = []
+    # 페이지에서 식단 표에 해당하는 부분. 이 부분의 해시가 지난번과 같으면 파싱을 건너뛴다 (None이면 본문 전체)
+    fingerprint_pattern = None
+    # crawl()에 필요한 부분만 파싱하기 위한 SoupStrainer (None이면 페이지 전체)
+    parse_only = None
+    # 데몬 모드에서 쓰는 날짜 구간별 폴링 주기 (None이면 PollSchedule.default_tiers)
+    poll_tiers = None
+    # 오늘부터 며칠 뒤까지 받을지, 한 번에 몇 페이지씩 받을지, 식단이 없는 페이지가 몇 번 이어지면 그 뒤는 받지 않을지
+    # (horizon_window가 None이면 한 번에 모두, horizon_empty_stop이 None이면 끝까지 받는다)
+    horizon_days = 30
+    horizon_window = None
+    horizon_empty_stop = None
+    # 이 크롤러가 만드는 식당 이름. 디버그 CLI가 --restaurant에 맞는 크롤러만 돌릴 때 쓴다.
+    restaurant_names = []
     not_meal = [
         "휴무",
         "휴점",
@@ -184,55 +357,204 @@ class RestaurantCrawler(metaclass=ABCMeta):
         "2중택1",  # 301동 '(1), (2) 중 택1', '(1), (2) 중 택 1'
     ]
 
-    def __init__(self):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.compile_matchers()
+        cls.normalizer_pipeline = NormalizerPipeline(cls.normalizer_classes)
+        # 이 크롤러가 맡은 식당의 code. 이번에 식단이 하나도 없던 식당도 확인한 날짜에는 DB와 비교한다.
+        cls.restaurant_codes = frozenset(text_normalizer(name, True) for name in cls.restaurant_names)
+
+    @classmethod
+    def serves(cls, restaurant):
+        # restaurant(일부)가 이 크롤러의 식당 이름 중 하나에 들어 있는지
+        return any(restaurant in name for name in cls.restaurant_names)
+
+    @classmethod
+    def compile_matchers(cls):
+        # 키워드 표는 크롤러 클래스마다 한 번만 컴파일한다
+        cls.not_meal_pattern = re.compile("|".join(f"(?:{pattern})" for pattern in cls.not_meal))
+
+    def __init__(self, client=None):
         self.meals = []
+        # handler.run_crawlers가 주입하는 공유 HttpClient. 없으면 요청마다 임시 세션을 연다.
+        self.client = client
+        # handler.run_crawlers가 주입하는 FingerprintStore와 파싱용 ProcessPoolExecutor
+        self.fingerprints = None
+        self.executor = None
+        # handler의 스트리밍 모드에서 주입하는 asyncio.Queue
+        self.sink = None
+        # (식당 code, 날짜) 중 지난번과 같은 페이지에서 나온 것 / 새로 파싱한 페이지에서 나온 것
+        self.unchanged_scopes = set()
+        self.changed_scopes = set()
+        # 이번 실행에서 페이지를 받아 확인한 날짜 (식단이 없던 날짜 포함)
+        self.covered_dates = set()
+        # 정규화에 쓴 시간과 not_meal 등으로 버린 식단 수 (parse_page가 metrics로 옮긴다)
+        self.stats = new_crawl_stats()
 
     @abstractmethod
     async def run_30days(self):
         pass
 
-    async def run(self, url=None, **kwargs):
-        urllib3.disable_warnings()
+    async def run_dates(self, dates):
+        # 날짜별로 페이지를 나누어 받을 수 없는 크롤러는 전체를 받는다
+        return await self.run_30days()
+
+    async def run_horizon(self, dates):
+        # dates(날짜 또는 주 시작 날짜)의 페이지를 순서대로 horizon_window개씩 받는다.
+        # 식단이 없는 페이지가 horizon_empty_stop번 이어지면 그 뒤 식단은 아직 올라오지 않은 것으로 보고 받지 않는다.
+        dates = sorted(dates)
+        window = self.horizon_window or len(dates) or 1
+        results = []
+        empty = 0
+        for start in range(0, len(dates), window):
+            if self.horizon_empty_stop and empty >= self.horizon_empty_stop:
+                metrics.inc("horizon_skipped_pages_total", len(dates) - start, crawler=type(self).__name__)
+                break
+            counts = await asyncio.gather(
+                *(self.run(date=date) for date in dates[start : start + window]), return_exceptions=True
+            )
+            results += counts
+            for count in counts:
+                # 받지 못한 페이지(None, 예외)는 비어 있다고 보지 않는다
+                empty = empty + 1 if count == 0 else 0
+        return results
+
+    async def fetch(self, url, method="GET", data=None):
+        if self.client is not None:
+            return await self.client.fetch(url, method, data, headers=self.headers, policy=self.request_policy)
+        async with HttpClient(self.headers) as client:
+            return await client.fetch(url, method, data, policy=self.request_policy)
+
+    async def run(self, url=None, method="GET", data=None, **kwargs):
+        # 페이지에서 찾은 식단 수를 돌려준다 (페이지를 받지 못했으면 None)
         if url is None:
             url = self.url
         try:
-            async with aiohttp.ClientSession(
-                headers=self.headers,
-                connector=aiohttp.TCPConnector(ssl=False),
-            ) as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        print(f"Failed to fetch {url}: Status code {response.status}")
-                        return
-                    html = await response.read()
-                    # html = await response.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    self.crawl(soup, **kwargs)
+            html = await self.fetch(url, method, data)
+            if html is None:
+                return None
+            return await self.parse_page(html, f"{type(self).__name__} {method} {url} {data or ''}", **kwargs)
         except Exception as e:
             print(f"Error in Run: {str(e)}")
             print(f"URL: {url}")
+            return None
+
+    def page_fragment(self, html):
+        if self.fingerprint_pattern is None:
+            return html
+        match = self.fingerprint_pattern.search(html)
+        return match.group() if match else html
+
+    async def parse_page(self, html, page_key, **kwargs):
+        crawler = type(self).__name__
+        metrics.inc("pages_total", crawler=crawler)
+        digest = None
+        if self.fingerprints is not None:
+            digest = page_digest(self.page_fragment(html), **kwargs)
+            records = self.fingerprints.lookup(page_key, digest)
+            if records is not None:
+                meals = [Meal.from_record(record) for record in records]
+                self.cover(meals, kwargs.get("date"))
+                self.unchanged_scopes.update((meal.restaurant_code, meal.date) for meal in meals)
+                self.fingerprints.stage(page_key, digest, records)
+                metrics.inc("pages_unchanged_total", crawler=crawler)
+                metrics.inc("meals_found_total", len(meals), crawler=crawler)
+                await self.emit(meals)
+                return len(meals)
+
+        started = time.perf_counter()
+        if self.executor is not None:
+            # 파싱과 정규화는 CPU를 쓰므로 프로세스 풀에서 하고, 이벤트 루프는 계속 다른 페이지를 받는다
+            loop = asyncio.get_running_loop()
+            records, stats = await loop.run_in_executor(
+                self.executor, crawl_records, type(self), html, kwargs, get_run_clock()
+            )
+            meals = [Meal.from_record(record) for record in records]
+        else:
+            # crawl()은 self.meals에 식단을 쌓으므로 이 페이지의 식단만 따로 받는다 (중간에 await가 없어 안전하다)
+            stored, self.meals = self.meals, []
+            stats = self.stats = new_crawl_stats()
+            try:
+                self.crawl(make_soup(html, self.parse_only), **kwargs)
+            finally:
+                meals, self.meals = self.meals, stored
+        metrics.observe("parse_seconds", time.perf_counter() - started, crawler=crawler)
+        metrics.observe("normalize_seconds", stats["normalize_seconds"], crawler=crawler)
+        metrics.inc("meals_found_total", len(meals), crawler=crawler)
+        metrics.inc("meals_dropped_total", stats["meals_dropped"], crawler=crawler)
+        self.cover(meals, kwargs.get("date"), stats["page_dates"])
+        self.changed_scopes.update((meal.restaurant_code, meal.date) for meal in meals)
+        if digest is not None:
+            self.fingerprints.stage(page_key, digest, [meal.as_record() for meal in meals])
+        await self.emit(meals)
+        return len(meals)
+
+    async def emit(self, meals):
+        # sink(asyncio.Queue)가 있으면 페이지마다 식단을 바로 넘기고 크롤러에는 쌓아 두지 않는다
+        if self.sink is None:
+            self.meals.extend(meals)
+        else:
+            await self.sink.put(meals)
+
+    def cover(self, meals, date=None, page_dates=()):
+        # page_dates: 파싱한 페이지에 있던 날짜 (식단이 모두 빠진 날짜도 DB에서 지우도록 포함한다)
+        if isinstance(date, datetime.date):
+            self.covered_dates.add(date)
+        self.covered_dates.update(page_dates)
+        self.covered_dates.update(meal.date for meal in meals)
+
+    def cover_date(self, date):
+        # crawl()에서 페이지에 있는 날짜마다 부른다 (식단이 없는 날짜 포함)
+        self.stats["page_dates"].add(parse_date(date))
+
+    def covered_scopes(self):
+        # 이 크롤러가 맡은 식당과 이번에 식단이 나온 식당 x 이번에 확인한 날짜.
+        # 여기에 없는 (식당, 날짜)는 DB와 비교하지 않는다.
+        restaurant_codes = self.restaurant_codes | {code for code, _ in self.unchanged_scopes | self.changed_scopes}
+        return {(code, date) for code in restaurant_codes for date in self.covered_dates}
 
     def normalize(self, meal, **kwargs):
-        for normalizer_cls in self.normalizer_classes:
-            meal = normalizer_cls().normalize(meal, **kwargs)
+        started = time.perf_counter()
+        meal = self.normalizer_pipeline.normalize(meal, **kwargs)
+        self.stats["normalize_seconds"] += time.perf_counter() - started
         return meal
 
     def is_meal_name_when_normalized(self, name):
-        normalized_name = text_normalizer(name, True)
-        if not normalized_name or normalized_name == "메뉴":
+        return self.is_meal_code(text_normalizer(name, True))
+
+    def is_meal_code(self, code):
+        if not code or code == "메뉴":
             return False
-        is_meal_name = all(re.match(".*" + p + ".*", normalized_name) is None for p in self.not_meal)
-        return is_meal_name
+        return self.not_meal_pattern.search(code) is None
+
+    def is_meal(self, meal):
+        return self.is_meal_code(meal.code)
 
     def found_meal(self, meal):
-        if meal and self.is_meal_name_when_normalized(meal.name):
+        if not meal:
+            return
+        if self.is_meal(meal):
             self.meals.append(meal)
+        else:
+            self.stats["meals_dropped"] += 1
 
     @abstractmethod
     def crawl(self, soup, **kwargs):
         pass
 
 
+def new_crawl_stats():
+    return {"normalize_seconds": 0.0, "meals_dropped": 0, "page_dates": set()}
+
+
+def crawl_records(crawler_cls, html, kwargs, clock=None):
+    # 프로세스 풀 워커에서 실행된다. 결과는 pickle하기 쉬운 레코드와 워커에서 잰 통계로 돌려준다.
+    set_run_clock(clock)
+    crawler = crawler_cls()
+    crawler.crawl(make_soup(html, crawler.parse_only), **kwargs)
+    return [meal.as_record() for meal in crawler.meals], crawler.stats
+
+
 def print_meals(meals):
     print("[")
     for meal in meals:
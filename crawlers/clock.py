@@ -0,0 +1,30 @@
+import datetime
+
+from pytz import timezone
+
+
+class RunClock:
+    """한 번의 크롤링 동안 쓰는 기준 시각. 식단마다 현재 시각과 시간대를 다시 구하지 않는다."""
+
+    tz = timezone("Asia/Seoul")
+
+    def __init__(self, now=None):
+        self.now = now or datetime.datetime.now(self.tz)
+        self.today = self.now.date()
+        self.year = self.now.year
+        # 날짜 없이 만든 Meal의 날짜 (기존과 같이 서버 시간대 기준)
+        self.local_date = datetime.date.fromtimestamp(self.now.timestamp())
+
+
+_run_clock = None
+
+
+def set_run_clock(clock=None):
+    # 크롤링을 시작할 때마다 부른다. 프로세스 풀 워커에는 부모의 clock을 넘겨 같은 기준 시각을 쓴다.
+    global _run_clock
+    _run_clock = clock or RunClock()
+    return _run_clock
+
+
+def get_run_clock():
+    return _run_clock or set_run_clock()
@@ -0,0 +1,58 @@
+import datetime
+import hashlib
+import json
+import os
+
+
+def page_digest(fragment, **kwargs):
+    # 파싱 결과에 영향을 주는 인자(date, menucosts 등)도 함께 해시한다
+    digest = hashlib.sha256(fragment)
+    digest.update(json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """페이지 조각의 해시와 그 페이지에서 나온 식단 레코드를 저장한다.
+
+    이번 실행에서 본 해시는 stage()로 모아 두었다가, DB 반영이 끝난 뒤 commit()해야 다음 실행에서 재사용된다.
+    DB 반영에 실패하면 discard()로 버려서, 다음 실행에서 같은 페이지를 다시 DB와 비교하게 한다.
+    """
+
+    # 이 기간 동안 다시 보지 못한 페이지(지난 날짜 등)는 지운다
+    max_age = datetime.timedelta(days=7)
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.pending = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Failed to load fingerprints: {str(e)}")
+
+    def lookup(self, page_key, digest):
+        entry = self.entries.get(page_key)
+        if entry is None or entry.get("digest") != digest:
+            return None
+        return entry.get("meals")
+
+    def stage(self, page_key, digest, records):
+        self.pending[page_key] = dict(digest=digest, meals=records, seen=datetime.date.today().isoformat())
+
+    def discard(self):
+        self.pending = {}
+
+    def commit(self):
+        self.entries.update(self.pending)
+        self.pending = {}
+        oldest = (datetime.date.today() - self.max_age).isoformat()
+        self.entries = {key: entry for key, entry in self.entries.items() if entry.get("seen", "") >= oldest}
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
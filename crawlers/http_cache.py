@@ -0,0 +1,124 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+
+
+class CachedResponse:
+    def __init__(self, meta, body):
+        self.meta = meta
+        self.body = body
+
+    def validators(self):
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+class HttpCache:
+    """응답 본문과 ETag/Last-Modified 검증자를 로컬 디렉터리에 저장한다.
+
+    조건부 GET에 쓸 수 없는 (검증자가 없는) 응답은 저장하지 않는다. record면 --replay에 쓰도록 모든 200 응답을 저장한다.
+    """
+
+    # 이 기간 동안 다시 받거나 304로 확인하지 않은 응답은 지운다 (데몬처럼 오래 떠 있어도 prune_interval마다)
+    max_age = datetime.timedelta(days=7)
+    prune_interval = datetime.timedelta(days=1)
+
+    def __init__(self, directory, record=False):
+        self.directory = directory
+        self.record = record
+        self.pruned_at = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(method, url, data=None):
+        raw = json.dumps([method.upper(), url, sorted((data or {}).items())], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def load(self, key):
+        try:
+            with open(self._path(key, "json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(self._path(key, "body"), "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        return CachedResponse(meta, body)
+
+    def store(self, key, url, headers, body):
+        meta = dict(url=url, etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"))
+        if not self.record and not meta["etag"] and not meta["last_modified"]:
+            return
+        # 본문을 먼저 쓰고 메타데이터를 나중에 바꿔, 중간에 죽어도 짝이 안 맞는 검증자가 남지 않게 한다
+        self._write(self._path(key, "body"), body)
+        self._write(self._path(key, "json"), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def touch(self, key):
+        # 304로 확인한 응답은 prune()에서 지우지 않는다
+        try:
+            os.utime(self._path(key, "json"))
+        except OSError:
+            pass
+
+    def maybe_prune(self):
+        # 녹화한 응답(record)은 --replay에 써야 하므로 지우지 않는다
+        if self.record:
+            return 0
+        now = time.time()
+        if self.pruned_at is not None and now - self.pruned_at < self.prune_interval.total_seconds():
+            return 0
+        self.pruned_at = now
+        return self.prune()
+
+    def prune(self):
+        # 메타데이터(.json)의 수정 시각 기준으로 max_age가 지난 응답을 지운다
+        oldest = time.time() - self.max_age.total_seconds()
+        pruned = 0
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext != ".json":
+                continue
+            try:
+                if os.path.getmtime(self._path(key, "json")) >= oldest:
+                    continue
+                os.remove(self._path(key, "json"))
+                os.remove(self._path(key, "body"))
+            except OSError:
+                continue
+            pruned += 1
+        return pruned
+
+    @staticmethod
+    def _write(path, content):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+class ReplayClient:
+    """HttpCache 디렉터리에 녹화된 응답만으로 HttpClient.fetch()에 답한다. 네트워크는 쓰지 않는다."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def fetch(self, url, method="GET", data=None, headers=None, policy=None):
+        cached = self.cache.load(self.cache.key(method, url, data))
+        if cached is None:
+            print(f"Not recorded: {method} {url} {data or ''}")
+            return None
+        return cached.body
@@ -0,0 +1,198 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from crawlers.metrics import metrics
+
+
+class RequestPolicy:
+    """호스트별 동시 요청 수, 초당 요청 수, 재시도 설정. 크롤러 클래스마다 request_policy로 지정한다."""
+
+    def __init__(
+        self, max_concurrency=4, rate=5.0, burst=5, max_retries=3, backoff_base=0.5, backoff_max=8.0, timeout=30
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+    def backoff(self, attempt):
+        # full jitter: 0 ~ min(max, base * 2^attempt) 사이에서 무작위로 기다린다
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostScheduler:
+    def __init__(self, policy):
+        self.semaphore = asyncio.Semaphore(policy.max_concurrency)
+        self.bucket = TokenBucket(policy.rate, policy.burst)
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status):
+        super().__init__(f"Status code {status}")
+        self.status = status
+
+
+async def _on_dns_start(session, context, params):
+    context.trace_request_ctx["dns_started"] = time.perf_counter()
+
+
+async def _on_dns_end(session, context, params):
+    timings = context.trace_request_ctx
+    timings["dns"] = time.perf_counter() - timings.pop("dns_started")
+
+
+async def _on_connect_start(session, context, params):
+    context.trace_request_ctx["connect_started"] = time.perf_counter()
+
+
+async def _on_connect_end(session, context, params):
+    timings = context.trace_request_ctx
+    timings["connect"] = time.perf_counter() - timings.pop("connect_started")
+
+
+def trace_config():
+    # 요청마다 DNS 조회, 연결 시간을 trace_request_ctx로 넘긴 dict에 기록한다
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    return config
+
+
+class HttpClient:
+    # 한 번의 크롤링 동안 모든 크롤러가 공유하는 커넥션 풀 설정
+    limit = 20
+    limit_per_host = 6
+    dns_cache_ttl = 300
+    keepalive_timeout = 30
+    default_policy = RequestPolicy()
+
+    def __init__(self, headers=None, cache=None):
+        self.headers = headers
+        # HttpCache가 주어지면 조건부 GET(If-None-Match/If-Modified-Since)을 보내고 304면 저장된 본문을 쓴다
+        self.cache = cache
+        self.session = None
+        self.hosts = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            ssl=False,
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, trace_configs=[trace_config()])
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    def scheduler(self, url, policy):
+        # 호스트마다 처음 요청한 크롤러의 정책으로 스케줄러를 만든다
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostScheduler(policy)
+        return self.hosts[host]
+
+    async def fetch(self, url, method="GET", data=None, headers=None, policy=None):
+        policy = policy or self.default_policy
+        scheduler = self.scheduler(url, policy)
+        for attempt in range(policy.max_retries + 1):
+            try:
+                async with scheduler.semaphore:
+                    await scheduler.bucket.acquire()
+                    return await self.request(url, method, data, headers, policy.timeout)
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError, RetryableStatus) as e:
+                metrics.inc("http_errors_total", host=urlsplit(url).netloc, error=type(e).__name__)
+                if attempt == policy.max_retries:
+                    if isinstance(e, RetryableStatus):
+                        print(f"Failed to fetch {url}: {str(e)} (after {attempt + 1} attempts)")
+                        return None
+                    raise
+                metrics.inc("http_retries_total", host=urlsplit(url).netloc)
+                await asyncio.sleep(policy.backoff(attempt))
+        return None
+
+    async def request(self, url, method, data, headers, timeout):
+        request_headers = dict(headers or {})
+        cache_key = cached = None
+        if self.cache is not None:
+            self.cache.maybe_prune()
+            cache_key = self.cache.key(method, url, data)
+            cached = self.cache.load(cache_key)
+            if cached is not None:
+                request_headers.update(cached.validators())
+
+        host = urlsplit(url).netloc
+        timings = {}
+        started = time.perf_counter()
+        async with self.session.request(
+            method,
+            url,
+            data=data,
+            headers=request_headers,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            trace_request_ctx=timings,
+        ) as response:
+            # 응답 헤더를 받을 때까지 걸린 시간 (DNS 조회, 연결 포함)
+            timings["ttfb"] = time.perf_counter() - started
+            body = None
+            if response.status == 200:
+                downloaded = time.perf_counter()
+                body = await response.read()
+                timings["download"] = time.perf_counter() - downloaded
+            self.record(url, host, method, response.status, timings, body)
+
+            if response.status == 304 and cached is not None:
+                self.cache.touch(cache_key)
+                return cached.body
+            if response.status >= 500:
+                raise RetryableStatus(response.status)
+            if response.status != 200:
+                print(f"Failed to fetch {url}: Status code {response.status}")
+                return None
+            if self.cache is not None:
+                self.cache.store(cache_key, url, response.headers, body)
+            return body
+
+    @staticmethod
+    def record(url, host, method, status, timings, body):
+        metrics.inc("http_requests_total", host=host, status=status)
+        for phase in ("dns", "connect", "ttfb", "download"):
+            if phase in timings:
+                metrics.observe(f"http_{phase}_seconds", timings[phase], host=host)
+        if body is not None:
+            metrics.inc("http_response_bytes_total", len(body), host=host)
+        metrics.record_request(
+            url=url, method=method, status=status, bytes=len(body) if body is not None else 0, **timings
+        )
@@ -0,0 +1,23 @@
+import re
+
+
+class KeywordMatcher:
+    """문자열에 들어있는 키워드를 한 번의 탐색으로 모두 찾는다."""
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(keywords)
+        # 긴 키워드를 앞에 두어 각 위치에서 가장 긴 키워드가 잡히게 한다
+        alternation = "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True))
+        self.pattern = re.compile(f"(?=({alternation}))") if self.keywords else None
+        # 가장 긴 키워드 안에 들어있는 짧은 키워드들도 같은 위치에서 나온 것으로 친다
+        self.contained = {
+            keyword: frozenset(other for other in self.keywords if other in keyword) for keyword in self.keywords
+        }
+
+    def search(self, text):
+        hits = set()
+        if self.pattern is None:
+            return hits
+        for match in self.pattern.finditer(text):
+            hits |= self.contained[match.group(1)]
+        return hits
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import time
+
+
+class MenuCostCache:
+    """기숙사식당 가격표 캐시. 한 크롤러의 모든 주간 요청이 같은 가격표를 함께 쓴다.
+
+    ttl 안에 받은 가격표는 다시 받지 않고, 가격표 페이지가 느리거나 실패하면 마지막으로 받은 가격표를 쓴다.
+    path가 주어지면 받은 가격표를 저장해 다음 실행에서도 쓴다.
+    """
+
+    ttl = 6 * 60 * 60
+    # 실패하거나 빈 가격표를 받았을 때 다시 시도하기까지의 시간
+    retry_interval = 5 * 60
+    # 마지막 가격표가 있으면 새 가격표를 이 시간(초)까지만 기다린다
+    stale_timeout = 5
+
+    def __init__(self, path=None):
+        self.path = path
+        self.prices = {}
+        self.fetched_at = None
+        self.expires_at = 0
+        # 진행 중인 요청. 여러 주간 요청이 동시에 가격표를 찾아도 한 번만 받는다.
+        self.task = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    saved = json.load(f)
+                self.prices = saved["prices"]
+                self.fetched_at = saved["fetched_at"]
+                self.expires_at = self.fetched_at + self.ttl
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Failed to load menu costs: {str(e)}")
+
+    def invalidate(self):
+        # 다음 get()에서 다시 받는다. 새 가격표를 받기 전까지와 실패했을 때는 지금 가격표를 쓴다.
+        self.expires_at = 0
+
+    def prefetch(self, fetch):
+        # fetch: 가격표 dict를 돌려주는 coroutine 함수. 만료되었으면 기다리지 않고 받기 시작만 한다.
+        if time.time() >= self.expires_at and (self.task is None or self.task.done()):
+            self.task = asyncio.ensure_future(self.refresh(fetch))
+        return self.task
+
+    async def get(self, fetch):
+        self.prefetch(fetch)
+        if self.task is None or self.task.done():
+            return self.prices
+        if not self.prices:
+            return await asyncio.shield(self.task)
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.task), self.stale_timeout)
+        except asyncio.TimeoutError:
+            print("Menu costs are slow to load. Using the last known menu costs.")
+            return self.prices
+
+    async def refresh(self, fetch):
+        try:
+            prices = await fetch()
+        except Exception as e:
+            print(f"Failed to fetch menu costs: {str(e)}")
+            prices = None
+        if prices:
+            self.prices = prices
+            self.fetched_at = time.time()
+            self.expires_at = self.fetched_at + self.ttl
+            self.save()
+        else:
+            self.expires_at = time.time() + self.retry_interval
+        return self.prices
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(dict(prices=self.prices, fetched_at=self.fetched_at), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
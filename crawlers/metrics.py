@@ -0,0 +1,141 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """크롤링 한 번 동안의 단계별 시간과 카운터. Prometheus textfile과 JSON 요약으로 내보낸다."""
+
+    prefix = "siksha_crawler_"
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        # (name, labels) -> [count, sum]
+        self.timers = {}
+        # URL별 HTTP 요청 기록 (JSON 요약에만 들어간다)
+        self.requests = []
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        timer = self.timers.setdefault(self._key(name, labels), [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_request(self, **request):
+        self.requests.append(request)
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        escaped = (
+            f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+            for name, value in labels
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def prometheus_text(self):
+        lines = []
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {self.prefix}{name} counter")
+            for (key_name, labels), value in sorted(self.counters.items()):
+                if key_name == name:
+                    lines.append(f"{self.prefix}{name}{self._labels(labels)} {value}")
+        for name in sorted({name for name, _ in self.timers}):
+            lines.append(f"# TYPE {self.prefix}{name} summary")
+            for (key_name, labels), (count, total) in sorted(self.timers.items()):
+                if key_name == name:
+                    lines.append(f"{self.prefix}{name}_count{self._labels(labels)} {count}")
+                    lines.append(f"{self.prefix}{name}_sum{self._labels(labels)} {total:.6f}")
+        lines.append(f"# TYPE {self.prefix}last_run_timestamp_seconds gauge")
+        lines.append(f"{self.prefix}last_run_timestamp_seconds {self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        return dict(
+            started=self.started,
+            duration=time.time() - self.started,
+            counters=[
+                dict(name=name, labels=dict(labels), value=value) for (name, labels), value in self.counters.items()
+            ],
+            timers=[
+                dict(name=name, labels=dict(labels), count=count, sum=total)
+                for (name, labels), (count, total) in self.timers.items()
+            ],
+            requests=self.requests,
+        )
+
+    def export(self):
+        # METRICS_TEXTFILE: node_exporter textfile collector용 파일, METRICS_JSON: 실행 요약,
+        # METRICS_PUSHGATEWAY_URL: Prometheus Pushgateway 주소
+        textfile = os.environ.get("METRICS_TEXTFILE")
+        if textfile:
+            self._write(textfile, self.prometheus_text())
+        json_path = os.environ.get("METRICS_JSON")
+        if json_path:
+            self._write(json_path, json.dumps(self.summary(), ensure_ascii=False, indent=2, default=str))
+        pushgateway_url = os.environ.get("METRICS_PUSHGATEWAY_URL")
+        if pushgateway_url:
+            self._push(pushgateway_url)
+
+    @staticmethod
+    def _write(path, content):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _push(self, url):
+        import requests  # pylint: disable=import-outside-toplevel
+
+        try:
+            res = requests.put(f"{url.rstrip('/')}/metrics/job/siksha_crawler", data=self.prometheus_text(), timeout=10)
+            res.raise_for_status()
+        except Exception as e:
+            print(f"Failed to push metrics: {str(e)}")
+
+
+class TimedCursor:
+    """DB cursor를 감싸 문장 종류(SELECT/INSERT/UPDATE/DELETE)별 실행 시간을 잰다."""
+
+    def __init__(self, cursor, registry=None):
+        self.cursor = cursor
+        self.registry = registry or metrics
+
+    @staticmethod
+    def _statement(query):
+        return query.split(None, 1)[0].upper() if query.strip() else "UNKNOWN"
+
+    def execute(self, query, args=None):
+        with self.registry.timer("db_statement_seconds", statement=self._statement(query)):
+            return self.cursor.execute(query, args)
+
+    def executemany(self, query, args):
+        with self.registry.timer("db_statement_seconds", statement=self._statement(query)):
+            return self.cursor.executemany(query, args)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+metrics = Metrics()
@@ -0,0 +1,62 @@
+import datetime
+
+
+class PollTier:
+    """오늘부터 first_day~last_day일 뒤의 날짜를 interval마다 다시 받는다. 식사 시간대에는 meal_time_interval을 쓴다."""
+
+    def __init__(self, name, first_day, last_day, interval, meal_time_interval=None):
+        self.name = name
+        self.first_day = first_day
+        self.last_day = last_day
+        self.interval = interval
+        self.meal_time_interval = meal_time_interval or interval
+
+    def dates(self, today):
+        return [today + datetime.timedelta(days=day) for day in range(self.first_day, self.last_day + 1)]
+
+    def interval_at(self, now, meal_times):
+        if any(start <= now.time() < end for start, end in meal_times):
+            return self.meal_time_interval
+        return self.interval
+
+
+class PollSchedule:
+    """크롤러 클래스 x tier마다 다음 폴링 시각을 관리한다. 크롤러 클래스의 poll_tiers로 tier를 바꿀 수 있다."""
+
+    default_tiers = [
+        # 오늘/내일 식단은 자주, 식사 시간 전후에는 더 자주 확인한다
+        PollTier("today", 0, 1, datetime.timedelta(minutes=30), datetime.timedelta(minutes=10)),
+        PollTier("week", 2, 7, datetime.timedelta(hours=3)),
+        PollTier("later", 8, 29, datetime.timedelta(hours=12)),
+    ]
+    # 식당들이 식단을 고치는 일이 많은 시간대 (Asia/Seoul)
+    meal_times = [
+        (datetime.time(10, 30), datetime.time(13, 30)),
+        (datetime.time(16, 30), datetime.time(19, 0)),
+    ]
+
+    # 이 시간 안에 돌아오는 다른 tier도 함께 받아서 폴링 횟수를 줄인다
+    coalesce = datetime.timedelta(minutes=1)
+
+    def __init__(self, crawler_classes):
+        self.tiers = {cls: cls.poll_tiers or self.default_tiers for cls in crawler_classes}
+        # (크롤러 클래스, tier 이름) -> 다음 폴링 시각. None이면 바로 받는다.
+        self.next_poll = {(cls, tier.name): None for cls, tiers in self.tiers.items() for tier in tiers}
+
+    def take_due(self, now):
+        # 지금 받아야 하는 {크롤러 클래스: 날짜 목록}을 돌려주고, 해당 tier의 다음 폴링 시각을 정한다
+        due = {}
+        for cls, tiers in self.tiers.items():
+            for tier in tiers:
+                next_poll = self.next_poll[(cls, tier.name)]
+                if next_poll is not None and next_poll > now + self.coalesce:
+                    continue
+                due.setdefault(cls, set()).update(tier.dates(now.date()))
+                self.next_poll[(cls, tier.name)] = now + tier.interval_at(now, self.meal_times)
+        return {cls: sorted(dates) for cls, dates in due.items()}
+
+    def seconds_until_next(self, now):
+        next_polls = [next_poll for next_poll in self.next_poll.values() if next_poll is not None]
+        if len(next_polls) < len(self.next_poll):
+            return 0
+        return max(0.0, (min(next_polls) - now).total_seconds())
@@ -1,47 +1,52 @@
-import asyncio
 import datetime
 import re
 
-from pytz import timezone
+from bs4 import SoupStrainer
 
 from crawlers.base_crawler import (
     FindParenthesisHash,
     FindPrice,
     Meal,
     MealNormalizer,
+    NameRewriter,
     RestaurantCrawler,
+    get_run_clock,
     text_normalizer,
 )
+from crawlers.http_client import RequestPolicy
+from crawlers.keyword_matcher import KeywordMatcher
 
 
-class RemoveMealNumber(MealNormalizer):
-    def normalize(self, meal, **kwargs):
-        if "①" in meal.name or "②" in meal.name:
-            meal.set_name(meal.name.replace("①", ""))
-            meal.set_name(meal.name.replace("②", ""))
-        return meal
+class RemoveMealNumber(NameRewriter):
+    def rewrite_name(self, name):
+        if "①" in name or "②" in name:
+            name = text_normalizer(text_normalizer(name.replace("①", "")).replace("②", ""))
+        return name
 
 
-class RemoveInfoFromMealName(MealNormalizer):
+class RemoveInfoFromMealName(NameRewriter):
     info_sign = ["※", "►", "※", "브레이크 타임"]
+    info_pattern = re.compile("(" + "|".join(info_sign) + ").*")
 
-    def normalize(self, meal, **kwargs):
-        meal.set_name(re.sub("(" + "|".join(self.info_sign) + ").*", "", meal.name))
-        return meal
+    def rewrite_name(self, name):
+        return text_normalizer(self.info_pattern.sub("", name))
 
 
 class FindRestaurantDetail(MealNormalizer):
+    # (정규식에 필요한 글자, 정규식). 그 글자가 이름에 없으면 정규식을 돌리지 않는다.
     restaurant_regex = [
-        r"(.*)\( ?(\d층.*)\)(.*)",
-        r"(.*)\((.*식당) ?\)(.*)",
-        r"(.*)< ?(\d층.*)>(.*)",
-        r"(.*)<(.*식당) ?>(.*)",
-        r"(.*)<(테이크아웃)>(.*)",
+        ("(", re.compile(r"(.*)\( ?(\d층.*)\)(.*)")),
+        ("(", re.compile(r"(.*)\((.*식당) ?\)(.*)")),
+        ("<", re.compile(r"(.*)< ?(\d층.*)>(.*)")),
+        ("<", re.compile(r"(.*)<(.*식당) ?>(.*)")),
+        ("<", re.compile(r"(.*)<(테이크아웃)>(.*)")),
     ]
 
     def normalize(self, meal, **kwargs):
-        for regex in self.restaurant_regex:
-            m = re.match(regex, meal.name)
+        for marker, regex in self.restaurant_regex:
+            if marker not in meal.name:
+                continue
+            m = regex.match(meal.name)
             if m:
                 meal.set_restaurant(meal.restaurant + ">" + m.group(2).strip())
                 meal.set_name(m.group(1).strip() + m.group(3).strip())
@@ -50,6 +55,8 @@ class FindRestaurantDetail(MealNormalizer):
 
 class SnucoRestaurantCrawler(RestaurantCrawler):
     url = "https://snuco.snu.ac.kr/foodmenu/"
+    # 하루에 한 페이지씩 30페이지를 받으므로 동시 요청을 조금 더 허용한다
+    request_policy = RequestPolicy(max_concurrency=6, rate=10.0, burst=10)
     normalizer_classes = [
         FindPrice,
         FindParenthesisHash,
@@ -57,6 +64,8 @@ class SnucoRestaurantCrawler(RestaurantCrawler):
         RemoveInfoFromMealName,
         RemoveMealNumber,
     ]
+    fingerprint_pattern = re.compile(rb'<table[^>]*class="[^"]*menu-table.*?</table>', re.S)
+    parse_only = SoupStrainer("table", class_="menu-table")
     next_line_str = ["봄", "소반", "콤비메뉴", "셀프코너", "채식뷔페", "추가코너", "돈까스비빔면셋트", "탄탄비빔면셋트"]
     next_line_keyword = ["지역맛집따라잡기", "호구셋트"]  # 다음 한 줄 있는 것들
     multi_line_keywords = {"+": ["셀프코너", "채식뷔페", "뷔페"], " / ": ["추가코너"]}  # 다음에 여러줄 있는 것들
@@ -81,15 +90,35 @@ class SnucoRestaurantCrawler(RestaurantCrawler):
         "8871123": "220동식당",
     }
     except_restaurant_list = ["기숙사식당"]  # snudorm에서 처리
-
-    def __init__(self):
-        super().__init__()
+    # 전화번호가 없는 식당 이름은 페이지에 적힌 그대로 쓰므로 여기 없는 이름이 나올 수 있다
+    restaurant_names = sorted(set(restaurant_phone_dict.values()) - set(except_restaurant_list)) + [
+        "두레미담>2층 뷔페식당"
+    ]
+    # 식단은 보통 1~2주 뒤까지만 올라오므로 일주일씩 받고, 식단이 없는 날이 10일 이어지면 그 뒤 날짜는 받지 않는다.
+    # 추석/설 연휴에 주말과 대체공휴일이 붙으면 일주일 넘게 비므로, 그 뒤에 올라온 식단을 놓치지 않도록 연휴보다 길게 잡는다.
+    horizon_window = 7
+    horizon_empty_stop = 10
+
+    @classmethod
+    def compile_matchers(cls):
+        super().compile_matchers()
+        cls.next_line_str_set = frozenset(cls.next_line_str)
+        cls.keyword_matcher = KeywordMatcher(
+            cls.next_line_keyword
+            + [keyword for keywords in cls.multi_line_keywords.values() for keyword in keywords]
+            + [keyword for pair in cls.multi_line_finisher.items() for keyword in pair]
+        )
+
+    def __init__(self, client=None):
+        super().__init__(client)
 
     def is_next_line_keyword(self, meal):
         if not meal:
             return False
-        code = text_normalizer(meal.name, True)
-        return any((str == code) for str in self.next_line_str) or any((str in code) for str in self.next_line_keyword)
+        code = meal.code
+        if code in self.next_line_str_set:
+            return True
+        return not self.keyword_matcher.search(code).isdisjoint(self.next_line_keyword)
 
     def filter_menu_names(self, meal_names: list):
         return [name for name in meal_names if self.is_meal_name_when_normalized(name)]
@@ -114,12 +143,13 @@ class SnucoRestaurantCrawler(RestaurantCrawler):
     def get_multi_line_delimiter(self, meal):
         if not meal:
             return None
-        code = text_normalizer(meal.name, True)
+        code = meal.code
+        hits = self.keyword_matcher.search(code)
         for keyword, finisher in self.multi_line_finisher.items():  # finisher 발견되면 delimiter가 없는 것 취급
-            if keyword in code and finisher in code:
+            if keyword in hits and finisher in hits:
                 return None
         for delimiter, keywords in self.multi_line_keywords.items():
-            if any((str in code) for str in keywords):
+            if not hits.isdisjoint(keywords):
                 return delimiter
         return None
 
@@ -134,19 +164,20 @@ class SnucoRestaurantCrawler(RestaurantCrawler):
         return last_meal
 
     async def run_30days(self):
-        date = datetime.datetime.now(timezone("Asia/Seoul")).date()
-        tasks = [self.run(date=date + datetime.timedelta(days=i)) for i in range(30)]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+        date = get_run_clock().today
+        return await self.run_dates([date + datetime.timedelta(days=i) for i in range(self.horizon_days)])
+
+    async def run_dates(self, dates):
+        return await self.run_horizon(dates)
 
     async def run(self, date=None, **kwargs):
         if not date:
-            date = datetime.datetime.now(timezone("Asia/Seoul")).date()
+            date = get_run_clock().today
         url = self.url + f"?date={date.year}-{date.month:02d}-{date.day:02d}"
-        await super().run(url, date=date, **kwargs)
+        return await super().run(url, date=date, **kwargs)
 
-    def found_meal(self, meal):
-        if meal and self.is_meal_name_when_normalized(meal.name) and "교직" not in meal.name:
-            self.meals.append(meal)
+    def is_meal(self, meal):
+        return super().is_meal(meal) and "교직" not in meal.name
 
     def get_name_from_raw_restaurant(self, row_restaurant):
         normalized = text_normalizer(row_restaurant)
@@ -165,7 +196,7 @@ class SnucoRestaurantCrawler(RestaurantCrawler):
             return restaurant_name
 
     def crawl(self, soup, **kwargs):
-        date = kwargs.get("date", datetime.datetime.now(timezone("Asia/Seoul")).date())
+        date = kwargs["date"] if "date" in kwargs else get_run_clock().today
         table = soup.find("table", {"class": "menu-table"})
         if not table:
             return
@@ -1,9 +1,6 @@
-import asyncio
-import urllib3
-import aiohttp
-from bs4 import BeautifulSoup
+import re
+from bs4 import SoupStrainer
 import datetime
-from pytz import timezone
 
 from crawlers.base_crawler import (
     MealNormalizer,
@@ -12,7 +9,10 @@ from crawlers.base_crawler import (
     text_normalizer,
     FindPrice,
     FindParenthesisHash,
+    make_soup,
+    get_run_clock,
 )
+from crawlers.menucost_cache import MenuCostCache
 
 
 class AddRestaurantDetail(MealNormalizer):
@@ -32,15 +32,28 @@ class SnudormRestaurantCrawler(RestaurantCrawler):
     url = "https://snudorm.snu.ac.kr/wp-admin/admin-ajax.php"
     menucost_url = "https://snudorm.snu.ac.kr/food-schedule/"
     restaurant = "기숙사식당"
+    restaurant_names = ["기숙사식당>901동", "기숙사식당>919동", "기숙사식당>아워홈"]
+    # 주간 페이지는 4개뿐이므로 빈 주가 있어도 한 번에 모두 받는다
+    horizon_days = 28
+    horizon_window = horizon_days // 7
     normalizer_classes = [FindPrice, FindParenthesisHash, AddRestaurantDetail]
+    fingerprint_pattern = re.compile(rb"<table.*</table>", re.S)
+    parse_only = SoupStrainer("table")
+    menucost_parse_only = SoupStrainer("div", class_="board")
+
+    def __init__(self, client=None, menucost_cache=None):
+        super().__init__(client)
+        self.menucost_cache = menucost_cache or MenuCostCache()
 
     async def get_menucosts(self):
-        urllib3.disable_warnings()
-        async with aiohttp.ClientSession(headers=self.headers, connector=aiohttp.TCPConnector(ssl=False)) as session:
-            async with session.get(self.menucost_url) as response:
-                html = await response.read()
-                soup = BeautifulSoup(html, "html.parser")
-                lis = soup.select("div.board > ul > li")
+        html = await self.fetch(self.menucost_url)
+        if html is None:
+            return {}
+        return self.parse_menucosts(html)
+
+    def parse_menucosts(self, html, parser=None):
+        soup = make_soup(html, self.menucost_parse_only, parser)
+        lis = soup.select("div.board > ul > li")
         prices = {}
         for li in lis:
             spans = li.find_all("span")
@@ -48,27 +61,34 @@ class SnudormRestaurantCrawler(RestaurantCrawler):
         return prices
 
     async def run_30days(self):
-        date = datetime.datetime.now(timezone("Asia/Seoul")).date()
-        menucosts = await self.get_menucosts()
-        tasks = [self.run(date=date + datetime.timedelta(weeks=i), menucosts=menucosts) for i in range(4)]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+        date = get_run_clock().today
+        return await self.run_dates([date + datetime.timedelta(days=i) for i in range(0, self.horizon_days, 7)])
+
+    async def run_dates(self, dates):
+        # 주간 페이지는 시작 날짜부터 7일을 보여 주므로, 요청한 날짜를 덮는 주간 페이지만 받는다
+        starts = []
+        for date in sorted(dates):
+            if not starts or date >= starts[-1] + datetime.timedelta(weeks=1):
+                starts.append(date)
+        return await self.run_horizon(starts)
 
     async def run(self, date=None, menucosts=None, **kwargs):
         if not date:
-            date = datetime.datetime.now(timezone("Asia/Seoul")).date()
+            date = get_run_clock().today
+        if not menucosts:
+            # 가격표는 캐시에서 가져온다. 새로 받아야 하면 주간 페이지와 동시에 받기 시작한다.
+            self.menucost_cache.prefetch(self.get_menucosts)
+        data = {
+            "action": "metapresso_dorm_food_week_list",
+            "start_week_date": date.isoformat(),
+            "target_blog": "39",
+        }
+        return await super().run(self.url, "POST", data, menucosts=menucosts, **kwargs)
+
+    async def parse_page(self, html, page_key, menucosts=None, **kwargs):
         if not menucosts:
-            menucosts = await self.get_menucosts()
-        urllib3.disable_warnings()
-        async with aiohttp.ClientSession(headers=self.headers, connector=aiohttp.TCPConnector(ssl=False)) as session:
-            data = {
-                "action": "metapresso_dorm_food_week_list",
-                "start_week_date": date.isoformat(),
-                "target_blog": "39",
-            }
-            async with session.post(self.url, data=data) as response:
-                html = await response.read()
-                soup = BeautifulSoup(html, "html.parser")
-                self.crawl(soup, menucosts=menucosts, **kwargs)
+            menucosts = await self.menucost_cache.get(self.get_menucosts)
+        return await super().parse_page(html, page_key, menucosts=menucosts, **kwargs)
 
     def crawl(self, soup, menucosts=None, **kwargs):
         if not menucosts:
@@ -77,6 +97,8 @@ class SnudormRestaurantCrawler(RestaurantCrawler):
         trs = soup.select("table > tbody > tr")
         ths = soup.select("table > thead > tr > th")
         dates = [th.text for th in ths[-7:]]
+        for date in dates:
+            self.cover_date(date)
         type = ""
         restaurant_detail = [[] for _ in range(len(trs))]
 
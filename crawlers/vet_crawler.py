@@ -1,10 +1,20 @@
 import asyncio
+import datetime
+import re
+
 from crawlers.base_crawler import RestaurantCrawler, Meal
+from crawlers.poll_schedule import PollTier
 
 
 class VetRestaurantCrawler(RestaurantCrawler):
     url = "https://vet.snu.ac.kr/금주의-식단/"
     restaurant = "수의대식당"
+    restaurant_names = [restaurant]
+    fingerprint_pattern = re.compile(rb"<table.*</table>", re.S)
+    # crawl()이 첫 div를 떼어내는 페이지 구조에 의존하므로 전체를 파싱한다
+    parse_only = None
+    # 한 페이지에 이번 주 식단이 모두 있으므로 날짜 구간을 나누지 않는다
+    poll_tiers = [PollTier("week", 0, 6, datetime.timedelta(hours=1), datetime.timedelta(minutes=20))]
 
     async def run_30days(self):
         return await asyncio.gather(self.run(), return_exceptions=True)
@@ -18,6 +28,7 @@ class VetRestaurantCrawler(RestaurantCrawler):
         for tr in trs[1:]:
             tds = tr.find_all("td")
             date = tds[0].text
+            self.cover_date(date)
             for col_idx, td in enumerate(tds[1:]):
                 meal = self.normalize(Meal(self.restaurant, td.text, date, types[col_idx]))
                 self.found_meal(meal)
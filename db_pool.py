@@ -0,0 +1,63 @@
+import asyncio
+
+from crawlers.metrics import TimedCursor
+
+
+class DbPool:
+    """DB 연결 풀. 트랜잭션은 스레드에서 실행해 크롤러와 같은 이벤트 루프를 막지 않고, 연결은 실행(데몬이면 폴링) 사이에 재사용한다.
+
+    connect는 인자 없이 DB-API 연결을 돌려주는 함수다 (기본은 pymysql, 테스트에서는 tests/local_db.py의 SQLite 연결).
+    쿼리는 pymysql 형식(%s, %(name)s 자리표시자)이고 행은 dict로 받는다.
+    """
+
+    def __init__(self, connect, size=2):
+        self.connect = connect
+        self.size = size
+        self.semaphore = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        try:
+            if self.idle:
+                conn = self.idle.pop()
+                # 쉬는 동안 끊긴 연결은 다시 연결한다 (ping이 없는 연결은 그대로 쓴다)
+                ping = getattr(conn, "ping", None)
+                if ping is not None:
+                    await asyncio.to_thread(ping, reconnect=True)
+                return conn
+            return await asyncio.to_thread(self.connect)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self, conn):
+        self.idle.append(conn)
+        self.semaphore.release()
+
+    @staticmethod
+    def _run(conn, func):
+        # 문장 종류별 DB 시간을 잰다
+        cursor = TimedCursor(conn.cursor())
+        try:
+            result = func(cursor)
+            conn.commit()
+            return result
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    async def transaction(self, func):
+        # func(cursor)를 연결 하나에서 실행하고, 끝나면 commit (예외가 나면 rollback)한다
+        conn = await self.acquire()
+        try:
+            return await asyncio.to_thread(self._run, conn, func)
+        finally:
+            self.release(conn)
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+        self.idle = []
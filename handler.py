@@ -2,168 +2,489 @@ import argparse
 import asyncio
 import datetime
 import os
-from itertools import compress
-
-import pymysql
-from pytz import timezone
-
-from crawlers.base_crawler import text_normalizer
-from crawlers.snuco_crawler import SnucoRestaurantCrawler
-from crawlers.snudorm_crawler import SnudormRestaurantCrawler
-from crawlers.vet_crawler import VetRestaurantCrawler
-from slack import (
-    _send_slack_message,
-    send_deleted_menus_message,
-    send_edited_menus_message,
-    send_new_menus_message,
-    send_new_restaurants_message,
-)
-
-
-def compare_and_get_new_restaurants(db_restaurants, crawled_meals):
-    existing_restaurant_codes = [restaurant.get("code") for restaurant in db_restaurants]
-    new_restaurants = []
-    for meal in crawled_meals:
-        restaurant_code_from_meal = text_normalizer(meal.restaurant, True)
-        if restaurant_code_from_meal not in existing_restaurant_codes:
-            new_restaurants.append(dict(code=restaurant_code_from_meal, name_kr=meal.restaurant))
-            existing_restaurant_codes.append(restaurant_code_from_meal)
-    return new_restaurants
-
-
-def remove_duplicate(menus):
-    unique_fields = ["restaurant_id", "code", "date", "type"]
-    unique = [True] * len(menus)
-    for i in range(len(menus)):
-        for j in range(i):
-            if all((menus[i].get(field) == menus[j].get(field)) for field in unique_fields):
-                unique[i] = False
-                break
-    return list(compress(menus, unique))
-
-
-def compare_menus(db_menus, crawled_meals, restaurants):
-    unique_fields = ["restaurant_id", "code", "date", "type"]
-    detail_fields = ["price", "etc"]
-    restaurant_dict = {restaurant.get("code"): restaurant.get("id") for restaurant in restaurants}
-    crawled_menus = [meal.as_dict() for meal in crawled_meals]
-    for menu in crawled_menus:
-        restaurant_code = text_normalizer(menu.pop("restaurant"), True)
-        menu["restaurant_id"] = restaurant_dict.get(restaurant_code)
-        name = menu.pop("name")
-        menu["name_kr"] = name
-        menu["code"] = text_normalizer(name, True)
-
-    crawled_menus = remove_duplicate(crawled_menus)
-
-    db_not_found = [True] * len(db_menus)
-    crawled_not_found = [True] * len(crawled_menus)
-    edited = [False] * len(db_menus)
-    for db_idx in range(len(db_menus)):
-        for crawled_idx in range(len(crawled_menus)):
-            if all(
-                (db_menus[db_idx].get(field, None) == crawled_menus[crawled_idx].get(field)) for field in unique_fields
-            ):
-                db_not_found[db_idx] = False
-                crawled_not_found[crawled_idx] = False
-                for field in detail_fields:
-                    if db_menus[db_idx].get(field, None) != crawled_menus[crawled_idx].get(field):
-                        edited[db_idx] = True
-                        db_menus[db_idx]["previous_" + field] = db_menus[db_idx].pop(field, None)
-                        db_menus[db_idx][field] = crawled_menus[crawled_idx].get(field)
-                break
-    return (
-        list(compress(crawled_menus, crawled_not_found)),
-        list(compress(db_menus, db_not_found)),
-        list(compress(db_menus, edited)),
-    )
-
-
-def restaurants_transaction(crawled_meals, cursor):
+import signal
+from concurrent.futures import ProcessPoolExecutor
+
+# pymysql, aiohttp, bs4 등 무거운 모듈은 쓰는 함수 안에서 불러온다 (benchmarks/import_budget.py로 확인한다)
+from crawlers import crawler_classes
+from crawlers.clock import RunClock, get_run_clock, set_run_clock
+from crawlers.fingerprint import FingerprintStore
+from crawlers.http_cache import HttpCache, ReplayClient
+from crawlers.menucost_cache import MenuCostCache
+from crawlers.metrics import metrics
+from crawlers.poll_schedule import PollSchedule
+from db_pool import DbPool
+from menu_diff import diff_menus, index_menus, menu_key
+from menu_snapshot import MenuSnapshot, synced_menus
+from restaurant_registry import RestaurantRegistry
+from slack import SlackNotifier
+
+# 스트리밍 모드에서 처리를 기다리는 페이지 수. 이보다 많이 밀리면 크롤러가 기다린다.
+STREAM_QUEUE_SIZE = 64
+
+
+def compare_menus(db_menus, crawled_meals, restaurants, scopes=None, crawled_index=None):
+    # restaurants: RestaurantRegistry
+    # crawled_index: 스트리밍 모드에서 크롤링하는 동안 만들어 둔 menu_key -> 메뉴 (없으면 crawled_meals로 만든다)
+    if crawled_index is None:
+        crawled_index = index_menus(meal.as_menu(restaurants.id_of(meal)) for meal in crawled_meals)
+
+    # scopes가 주어지면 그 (restaurant_id, 날짜)에 해당하는 메뉴만 비교한다
+    if scopes is not None:
+        db_menus = [menu for menu in db_menus if (menu.get("restaurant_id"), menu.get("date")) in scopes]
+        crawled_index = {
+            key: menu for key, menu in crawled_index.items() if (menu["restaurant_id"], menu["date"]) in scopes
+        }
+
+    return diff_menus(db_menus, crawled_index)
+
+
+def fetch_restaurants(cursor):
     get_restaurants_query = """
-        SELECT code
+        SELECT id, code
         FROM restaurant;
     """
     cursor.execute(get_restaurants_query)
-    db_restaurants = cursor.fetchall()
-    new_restaurants = compare_and_get_new_restaurants(db_restaurants, crawled_meals)
-    send_new_restaurants_message(new_restaurants)
+    return cursor.fetchall()
+
+
+def restaurants_transaction(crawled_meals, cursor, notifier, restaurants=None):
+    # restaurants: 미리 읽어 둔 RestaurantRegistry. 새 식당까지 더해 돌려주므로 menus_transaction에서 다시 읽지 않는다.
+    if restaurants is None:
+        restaurants = RestaurantRegistry(fetch_restaurants(cursor))
+    insert_restaurants(cursor, restaurants.find_new(crawled_meals), notifier, restaurants)
+    return restaurants
+
+
+def insert_restaurants(cursor, new_restaurants, notifier, restaurants=None):
+    notifier.add_new_restaurants(new_restaurants)
     insert_restaurants_query = """
         INSERT INTO restaurant(code, name_kr)
         VALUES (%(code)s, %(name_kr)s);
     """
-    cursor.executemany(insert_restaurants_query, new_restaurants)
+    # 새 식당은 드물므로 하나씩 넣고 lastrowid로 id를 채운다
+    for restaurant in new_restaurants:
+        cursor.execute(insert_restaurants_query, restaurant)
+        restaurant["id"] = cursor.lastrowid
+        if restaurants is not None:
+            restaurants.add(restaurant)
     print("Restaurants checked")
 
 
-def menus_transaction(crawled_meals, cursor):
-    get_restaurants_query = """
-        SELECT id, code
-        FROM restaurant;
+def chunked(items, size=None):
+    size = size or int(os.environ.get("MENU_SYNC_CHUNK_SIZE", 500))
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def delete_menus(cursor, menus):
+    ids = [menu.get("id") for menu in menus]
+    for chunk in chunked(ids):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM menu WHERE id IN ({placeholders});", chunk)
+
+
+def upsert_menus(cursor, menus):
+    columns = ("restaurant_id", "code", "date", "type", "name_kr", "price", "etc")
+    for chunk in chunked(menus):
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(chunk))
+        upsert_menus_query = f"""
+            INSERT INTO menu({", ".join(columns)})
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE name_kr=VALUES(name_kr), price=VALUES(price), etc=VALUES(etc);
+        """
+        cursor.execute(upsert_menus_query, [menu.get(column) for menu in chunk for column in columns])
+
+
+def fetch_menus_between(cursor, restaurant_ids, start, end):
+    # restaurant_ids 식당의 start~end 메뉴를 menu(restaurant_id, date) 인덱스로 읽는다
+    if not restaurant_ids:
+        return []
+    get_menus_query = f"""
+        SELECT id, restaurant_id, code, date, type, price, etc, name_kr
+        FROM menu
+        WHERE restaurant_id IN ({", ".join(["%s"] * len(restaurant_ids))}) AND date BETWEEN %s AND %s;
     """
-    cursor.execute(get_restaurants_query)
-    restaurants = cursor.fetchall()
-    today = datetime.datetime.now(timezone("Asia/Seoul")).date()
+    cursor.execute(get_menus_query, sorted(restaurant_ids) + [start, end])
+    return cursor.fetchall()
+
+
+def fetch_scoped_menus(cursor, scopes):
+    # 식당과 날짜 범위로 가져온 뒤, 정확한 (식당, 날짜) 쌍으로 거른다
+    if not scopes:
+        return []
+    restaurant_ids = {restaurant_id for restaurant_id, _ in scopes}
+    dates = [date for _, date in scopes]
+    menus = fetch_menus_between(cursor, restaurant_ids, min(dates), max(dates))
+    return [menu for menu in menus if (menu.get("restaurant_id"), menu.get("date")) in scopes]
+
+
+def fetch_future_menus(cursor, today):
     get_menus_query = f"""
         SELECT id, restaurant_id, code, date, type, price, etc, name_kr
         FROM menu
         WHERE date>='{today.isoformat()}';
     """
     cursor.execute(get_menus_query)
-    db_menus = cursor.fetchall()
-    new_menus, deleted_menus, edited_menus = compare_menus(db_menus, crawled_meals, restaurants)
-
-    if deleted_menus:
-        deleted_menus_id = [str(menu.get("id")) for menu in deleted_menus]
-        delete_menus_query = f"""
-            DELETE FROM menu
-            WHERE id in ({','.join(deleted_menus_id)});
+    return cursor.fetchall()
+
+
+class PrefetchedMenus:
+    """크롤링과 동시에 미리 읽어 둔 메뉴. restaurant_ids가 None이면 오늘 이후 전체, 아니면 그 식당들의 until까지의 메뉴다."""
+
+    def __init__(self, menus, restaurant_ids=None, until=None):
+        self.menus = menus
+        self.restaurant_ids = restaurant_ids
+        self.until = until
+
+    @property
+    def complete(self):
+        return self.restaurant_ids is None
+
+    def covers(self, scope):
+        restaurant_id, date = scope
+        return self.complete or (restaurant_id in self.restaurant_ids and date <= self.until)
+
+    def scoped(self, scopes):
+        return [menu for menu in self.menus if (menu.get("restaurant_id"), menu.get("date")) in scopes]
+
+
+def fetch_new_menu_ids(cursor, new_menus):
+    # 방금 넣은 메뉴의 id를 (restaurant_id, 날짜)로 좁혀서 조회해 menu_key로 맞춘다
+    new_index = {menu_key(menu): menu for menu in new_menus}
+    scopes = sorted({(menu.get("restaurant_id"), menu.get("date")) for menu in new_menus})
+    for chunk in chunked(scopes):
+        get_ids_query = f"""
+            SELECT id, restaurant_id, code, date, type
+            FROM menu
+            WHERE (restaurant_id, date) IN ({", ".join(["(%s, %s)"] * len(chunk))});
         """
-        cursor.execute(delete_menus_query)
-    send_deleted_menus_message(deleted_menus)
+        cursor.execute(get_ids_query, [value for scope in chunk for value in scope])
+        for row in cursor.fetchall():
+            menu = new_index.get(menu_key(row))
+            if menu is not None:
+                menu["id"] = row.get("id")
+
+
+def menus_transaction(
+    crawled_meals,
+    cursor,
+    notifier,
+    scopes=None,
+    snapshot=None,
+    reconcile=False,
+    restaurants=None,
+    future_menus=None,
+    crawled_index=None,
+):
+    # restaurants, future_menus: 크롤링과 동시에 미리 읽어 둔 RestaurantRegistry와 PrefetchedMenus (없거나 모자라면 여기서 읽는다)
+    # crawled_index: 스트리밍 모드에서 크롤링하는 동안 색인해 둔 크롤링 메뉴 (주어지면 crawled_meals는 쓰지 않는다)
+    if restaurants is None:
+        restaurants = RestaurantRegistry(fetch_restaurants(cursor))
+    today = get_run_clock().today
+    if scopes is not None:
+        scopes = restaurants.scope_ids(scopes)
+
+    snapshot_menus = None
+    reconcile = snapshot is not None and (reconcile or snapshot.needs_reconcile())
+    if snapshot is not None and not reconcile:
+        # 평소에는 지난 동기화 결과(로컬 스냅샷)와 비교하고 MySQL은 바뀐 메뉴를 쓸 때만 쓴다
+        db_menus = snapshot.fetch_menus(today, scopes)
+    elif reconcile:
+        # 스냅샷을 MySQL 전체와 맞춘다
+        snapshot_menus = (
+            future_menus.menus
+            if future_menus is not None and future_menus.complete
+            else fetch_future_menus(cursor, today)
+        )
+        drifted = snapshot.drift(snapshot_menus, today)
+        metrics.inc("snapshot_drift_menus_total", drifted)
+        print(f"Snapshot reconciled: {drifted} menus differed from DB")
+        db_menus = snapshot_menus
+        if scopes is not None:
+            db_menus = [menu for menu in db_menus if (menu.get("restaurant_id"), menu.get("date")) in scopes]
+    elif scopes is None:
+        db_menus = (
+            future_menus.menus
+            if future_menus is not None and future_menus.complete
+            else fetch_future_menus(cursor, today)
+        )
+    else:
+        # 미리 읽어 둔 범위 밖의 (식당, 날짜)만 더 읽는다
+        prefetched = {scope for scope in scopes if future_menus is not None and future_menus.covers(scope)}
+        db_menus = fetch_scoped_menus(cursor, scopes - prefetched)
+        if prefetched:
+            db_menus += future_menus.scoped(prefetched)
+    with metrics.timer("diff_seconds"):
+        new_menus, deleted_menus, edited_menus = compare_menus(
+            db_menus, crawled_meals, restaurants, scopes, crawled_index
+        )
+    metrics.inc("menus_synced_total", len(new_menus), change="new")
+    metrics.inc("menus_synced_total", len(deleted_menus), change="deleted")
+    metrics.inc("menus_synced_total", len(edited_menus), change="edited")
 
-    insert_menus_query = """
-        INSERT INTO menu(restaurant_id, code, date, type, name_kr, price, etc)
-        VALUES (%(restaurant_id)s, %(code)s, %(date)s, %(type)s, %(name_kr)s, %(price)s, %(etc)s);
-    """
-    cursor.executemany(insert_menus_query, new_menus)
-    send_new_menus_message(new_menus)
+    delete_menus(cursor, deleted_menus)
+    notifier.add_deleted_menus(deleted_menus)
 
-    edited_menus_query = """
-        UPDATE menu
-        SET price=%(price)s, etc=%(etc)s, name_kr=%(name_kr)s
-        WHERE id=%(id)s;
-    """
-    cursor.executemany(edited_menus_query, edited_menus)
-    send_edited_menus_message(edited_menus)
+    if os.environ.get("MENU_SYNC_MODE") == "upsert":
+        # menu(restaurant_id, code, date, type) unique key가 있어야 한다
+        upsert_menus(cursor, new_menus + edited_menus)
+    else:
+        insert_menus_query = """
+            INSERT INTO menu(restaurant_id, code, date, type, name_kr, price, etc)
+            VALUES (%(restaurant_id)s, %(code)s, %(date)s, %(type)s, %(name_kr)s, %(price)s, %(etc)s);
+        """
+        cursor.executemany(insert_menus_query, new_menus)
+
+        edited_menus_query = """
+            UPDATE menu
+            SET price=%(price)s, etc=%(etc)s, name_kr=%(name_kr)s
+            WHERE id=%(id)s;
+        """
+        cursor.executemany(edited_menus_query, edited_menus)
+    notifier.add_new_menus(new_menus)
+    notifier.add_edited_menus(edited_menus)
+
+    if snapshot is not None:
+        fetch_new_menu_ids(cursor, new_menus)
+        if reconcile:
+            snapshot.stage(synced_menus(snapshot_menus, new_menus, deleted_menus), today, reconciled=True)
+        else:
+            snapshot.stage(synced_menus(db_menus, new_menus, deleted_menus), today, scopes)
 
     print("Menus checked")
 
 
-async def run_crawlers(crawlers):
-    tasks = [asyncio.create_task(crawler.run_30days()) for crawler in crawlers]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+def create_http_cache():
+    # CRAWLER_CACHE_DIR이 설정된 경우에만 응답을 디스크에 캐시한다
+    cache_dir = os.environ.get("CRAWLER_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return HttpCache(os.path.join(cache_dir, "http"))
 
 
-def crawl_debug(**kwargs):
-    arg_date = kwargs.get("date")
-    arg_restaurant = kwargs.get("restaurant")
+def open_http_client(record_dir=None, replay_dir=None):
+    # replay_dir: 녹화된 응답만 쓰고 네트워크는 쓰지 않는다. record_dir: 받은 응답을 replay_dir로 쓸 수 있게 저장한다.
+    if replay_dir:
+        return ReplayClient(HttpCache(replay_dir))
+    from crawlers.base_crawler import RestaurantCrawler  # pylint: disable=import-outside-toplevel
+    from crawlers.http_client import HttpClient  # pylint: disable=import-outside-toplevel
+
+    return HttpClient(
+        RestaurantCrawler.headers, HttpCache(record_dir, record=True) if record_dir else create_http_cache()
+    )
+
+
+def create_fingerprint_store():
+    cache_dir = os.environ.get("CRAWLER_CACHE_DIR")
+    if not cache_dir:
+        return None
+    return FingerprintStore(os.path.join(cache_dir, "fingerprints.json"))
+
+
+def create_menu_snapshot():
+    # MENU_SNAPSHOT_PATH가 설정되면 MySQL 대신 로컬 스냅샷과 비교하고, SNAPSHOT_RECONCILE_HOURS마다 MySQL과 맞춘다
+    path = os.environ.get("MENU_SNAPSHOT_PATH")
+    if not path:
+        return None
+    reconcile_hours = float(os.environ.get("SNAPSHOT_RECONCILE_HOURS", 24))
+    return MenuSnapshot(path, datetime.timedelta(hours=reconcile_hours))
+
 
-    crawlers = [VetRestaurantCrawler(), SnudormRestaurantCrawler(), SnucoRestaurantCrawler()]
-    results = asyncio.run(run_crawlers(crawlers))
+def create_menucost_cache():
+    # CRAWLER_CACHE_DIR이 설정되면 기숙사식당 가격표를 저장해 두고 ttl 동안 다시 받지 않는다
+    cache_dir = os.environ.get("CRAWLER_CACHE_DIR")
+    return MenuCostCache(os.path.join(cache_dir, "menucosts.json") if cache_dir else None)
+
+
+def get_sync_scopes(crawlers, today):
+    # 이번 실행에서 확인한 (식당 code, 날짜) 중, 지난번과 똑같은 페이지에서만 나온 것은 이미 DB에 반영되어 있으므로 뺀다
+    covered_scopes = set()
+    unchanged_scopes = set()
+    changed_scopes = set()
+    for crawler in crawlers:
+        covered_scopes |= crawler.covered_scopes()
+        unchanged_scopes |= crawler.unchanged_scopes
+        changed_scopes |= crawler.changed_scopes
+    scopes = covered_scopes - (unchanged_scopes - changed_scopes)
+    return {(code, date) for code, date in scopes if date >= today}
+
+
+def create_parse_executor():
+    # CRAWLER_PARSE_WORKERS > 0이면 HTML 파싱과 식단 정규화를 그 수만큼의 프로세스에서 한다
+    workers = int(os.environ.get("CRAWLER_PARSE_WORKERS", 0))
+    if workers <= 0:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def create_crawlers(classes=None, menucost_cache=None):
+    # classes가 없으면 등록된 크롤러 전부. 크롤러 모듈은 여기서 처음 불러온다.
+    crawlers = [crawler_cls() for crawler_cls in classes or crawler_classes()]
+    for crawler in crawlers:
+        # 기숙사식당 가격표 캐시는 실행(데몬이면 폴링) 사이에 함께 쓴다
+        if menucost_cache is not None and hasattr(crawler, "menucost_cache"):
+            crawler.menucost_cache = menucost_cache
+    return crawlers
+
+
+class MealStream:
+    """스트리밍 모드에서 크롤러가 페이지마다 넘기는 식단을 받아 새 식당 확인과 diff 색인을 바로 해 둔다.
+
+    index는 diff_menus가 그대로 쓰는 menu_key -> 메뉴 색인이다. 크롤링이 끝나면 새 식당의 식단만 더 색인하면 된다.
+    """
+
+    def __init__(self, restaurants, today):
+        # restaurants: RestaurantRegistry. 새 식당은 DB에 넣을 때 등록되므로 그 전까지는 new_restaurants에 모은다.
+        self.restaurants = restaurants
+        self.new_restaurants = {}
+        self.today = today
+        # menu_diff.menu_key -> 먼저 나온 메뉴 (index_menus와 같다)
+        self.index = {}
+        # 새 식당의 식단. restaurant_id가 생긴 뒤 index_new_restaurants()에서 색인한다.
+        self.pending_meals = []
+
+    def add(self, meals):
+        for meal in meals:
+            if meal.date < self.today:
+                continue
+            restaurant_id = self.restaurants.id_of(meal)
+            if restaurant_id is None:
+                restaurant_code = self.restaurants.code_of(meal)
+                if restaurant_code not in self.new_restaurants:
+                    self.new_restaurants[restaurant_code] = dict(code=restaurant_code, name_kr=meal.restaurant)
+                self.pending_meals.append(meal)
+                continue
+            self._index(meal, restaurant_id)
+
+    def _index(self, meal, restaurant_id):
+        menu = meal.as_menu(restaurant_id)
+        self.index.setdefault(menu_key(menu), menu)
+
+    def index_new_restaurants(self):
+        # insert_restaurants()가 새 식당을 등록한 뒤에 부른다
+        for meal in self.pending_meals:
+            self._index(meal, self.restaurants.id_of(meal))
+        self.pending_meals = []
+        return self.index
+
+
+def load_db_state(cursor, today, menus=None, crawlers=()):
+    # 식당 목록과 prefetch_menus()가 정한 범위의 메뉴. 두 트랜잭션이 이것을 함께 쓴다.
+    restaurants = RestaurantRegistry(fetch_restaurants(cursor))
+    future_menus = None
+    if menus == "all":
+        future_menus = PrefetchedMenus(fetch_future_menus(cursor, today))
+    elif menus == "crawlers":
+        # 크롤러가 맡은 식당 x 오늘부터 가장 긴 크롤링 기간까지 (그 밖에서 나온 식단은 diff 직전에 더 읽는다)
+        restaurant_ids = {
+            restaurants.ids[code] for crawler in crawlers for code in crawler.restaurant_codes if code in restaurants
+        }
+        until = today + datetime.timedelta(days=max((crawler.horizon_days for crawler in crawlers), default=0))
+        future_menus = PrefetchedMenus(fetch_menus_between(cursor, restaurant_ids, today, until), restaurant_ids, until)
+    return dict(restaurants=restaurants, menus=future_menus)
+
+
+def prefetch_menus(fingerprints=None, snapshot=None, reconcile=False):
+    # 크롤링과 동시에 미리 읽을 메뉴 범위. "all"은 오늘 이후 전체 (스냅샷을 MySQL과 맞출 때),
+    # "crawlers"는 크롤러가 맡은 식당의 크롤링 기간, None이면 diff 직전에 비교할 (식당, 날짜)만 읽는다.
+    # 페이지 해시로 바뀐 (식당, 날짜)만 비교하거나 스냅샷과 비교할 때는 그 범위만 나중에 읽는 편이 적게 읽는다.
+    if snapshot is not None:
+        return "all" if reconcile or snapshot.needs_reconcile() else None
+    return "crawlers" if fingerprints is None else None
+
+
+async def prefetch_db_state(pool, today, menus=None, crawlers=()):
+    # 크롤링과 동시에 DB 상태를 읽어 두어, 크롤링이 끝나면 바로 diff를 시작한다
+    with metrics.timer("stage_seconds", stage="db_prefetch"):
+        return await pool.transaction(lambda cursor: load_db_state(cursor, today, menus, crawlers))
+
+
+async def stream_crawlers(crawlers, pool, today, fingerprints=None, menus=None):
+    # 크롤러는 페이지를 파싱할 때마다 식단을 queue에 넣고, 여기서는 느린 사이트를 기다리는 동안 받은 식단부터 처리한다.
+    # queue 크기를 제한해 두어 처리가 밀리면 크롤러가 기다린다.
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    for crawler in crawlers:
+        crawler.sink = queue
+
+    async def produce():
+        try:
+            return await run_crawlers(crawlers, fingerprints)
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    db_state = await prefetch_db_state(pool, today, menus, crawlers)
+    stream = MealStream(db_state["restaurants"], today)
+    while (meals := await queue.get()) is not None:
+        stream.add(meals)
+    return await producer, stream, db_state
+
+
+def raise_crawler_errors(results):
+    # 크롤러마다 페이지별 결과(식단 수 또는 예외) 목록이 온다
     for result in results:
+        if isinstance(result, BaseException):
+            raise result
         for err in result:
-            if err is not None:
+            if isinstance(err, BaseException):
                 raise err
-    crawled_meals = []
+
+
+def attach_crawlers(crawlers, client, fingerprints=None, executor=None):
     for crawler in crawlers:
-        crawled_meals = crawled_meals + crawler.meals
+        crawler.client = client
+        crawler.fingerprints = fingerprints
+        crawler.executor = executor
+
 
-    today = datetime.datetime.now(timezone("Asia/Seoul")).date()
+async def run_crawlers(crawlers, fingerprints=None, dates=None, record_dir=None, replay_dir=None):
+    # dates가 주어지면 30일 전체 대신 그 날짜의 페이지만 받는다
+    executor = create_parse_executor()
+    try:
+        # 모든 크롤러와 날짜가 하나의 커넥션 풀(keep-alive, 호스트별 제한, DNS 캐시)을 공유한다
+        async with open_http_client(record_dir, replay_dir) as client:
+            attach_crawlers(crawlers, client, fingerprints, executor)
+            tasks = [
+                asyncio.create_task(crawler.run_30days() if dates is None else crawler.run_dates(dates))
+                for crawler in crawlers
+            ]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def debug_crawler_classes(restaurant):
+    # restaurant가 알려진 식당 이름에 맞는 크롤러만 돌린다. 맞는 크롤러가 없으면 (처음 보는 식당일 수 있으므로) 전부 돌린다.
+    classes = crawler_classes()
+    return [crawler_cls for crawler_cls in classes if crawler_cls.serves(restaurant)] or classes
 
+
+def crawl_debug(**kwargs):
+    arg_date = kwargs.get("date")
+    arg_restaurant = kwargs.get("restaurant")
+    set_run_clock()
+
+    ndate = None
     if arg_date is not None:
         ndate = datetime.datetime(int(arg_date[:4]), int(arg_date[4:6]), int(arg_date[6:])).date()
 
+    crawlers = create_crawlers(debug_crawler_classes(arg_restaurant))
+    results = asyncio.run(
+        run_crawlers(
+            crawlers,
+            dates=[ndate] if ndate is not None else None,
+            record_dir=kwargs.get("record"),
+            replay_dir=kwargs.get("replay"),
+        )
+    )
+    raise_crawler_errors(results)
+    crawled_meals = [meal for crawler in crawlers for meal in crawler.meals]
+
+    today = get_run_clock().today
+
+    if ndate is not None:
         crawled_meals = list(
             filter(lambda meal: (meal.date == ndate and arg_restaurant in meal.restaurant), crawled_meals)
         )
@@ -177,45 +498,209 @@ def crawl_debug(**kwargs):
         print(meal.as_dict())
 
 
-def crawl(event, context):
-    siksha_db = pymysql.connect(
+def connect_db():
+    import pymysql  # pylint: disable=import-outside-toplevel
+
+    return pymysql.connect(
         user=os.environ.get("DB_USER", "siksha"),
         password=os.environ.get("DB_PASSWORD", "waffle"),
         host=os.environ.get("DB_HOST", "127.0.0.1"),
         database=os.environ.get("DB_NAME", "siksha"),
         port=int(os.environ.get("DB_PORT", 7306)),
         charset="utf8",
+        cursorclass=pymysql.cursors.DictCursor,
     )
-    cursor = siksha_db.cursor(pymysql.cursors.DictCursor)
+
+
+def create_db_pool(connect=None):
+    # connect: DB 연결을 만드는 함수 (기본은 connect_db). 한 번의 실행(데몬이면 프로세스) 동안 연결을 재사용한다.
+    return DbPool(connect or connect_db, size=int(os.environ.get("DB_POOL_SIZE", 2)))
+
+
+async def sync_menus(
+    pool,
+    notifier,
+    crawled_meals,
+    scopes,
+    fingerprints=None,
+    snapshot=None,
+    reconcile=False,
+    restaurants=None,
+    future_menus=None,
+    crawled_index=None,
+):
+    with metrics.timer("stage_seconds", stage="menus_transaction"):
+        await pool.transaction(
+            lambda cursor: menus_transaction(
+                crawled_meals, cursor, notifier, scopes, snapshot, reconcile, restaurants, future_menus, crawled_index
+            )
+        )
+    # DB 반영이 끝난 뒤에야 스냅샷과 페이지 해시를 다음 실행에서 쓸 수 있다
+    if snapshot is not None:
+        snapshot.commit()
+    if fingerprints is not None:
+        fingerprints.commit()
+
+
+async def crawl_and_sync(event, pool, notifier):
+    crawlers = create_crawlers(menucost_cache=create_menucost_cache())
+    fingerprints = create_fingerprint_store()
+    snapshot = create_menu_snapshot()
+    today = get_run_clock().today
+    reconcile = bool((event or {}).get("reconcile"))
+    menus = prefetch_menus(fingerprints, snapshot, reconcile)
+    try:
+        if os.environ.get("CRAWL_MODE") == "stream":
+            with metrics.timer("stage_seconds", stage="crawl"):
+                results, stream, db_state = await stream_crawlers(crawlers, pool, today, fingerprints, menus)
+            raise_crawler_errors(results)
+            # 크롤링하는 동안 색인해 둔 메뉴를 diff에 그대로 쓴다
+            crawled_meals = None
+            with metrics.timer("stage_seconds", stage="restaurants_transaction"):
+                await pool.transaction(
+                    lambda cursor: insert_restaurants(
+                        cursor, list(stream.new_restaurants.values()), notifier, db_state["restaurants"]
+                    )
+                )
+            restaurants = db_state["restaurants"]
+            crawled_index = stream.index_new_restaurants()
+        else:
+            with metrics.timer("stage_seconds", stage="crawl"):
+                results, db_state = await asyncio.gather(
+                    run_crawlers(crawlers, fingerprints), prefetch_db_state(pool, today, menus, crawlers)
+                )
+            raise_crawler_errors(results)
+            crawled_meals = [meal for crawler in crawlers for meal in crawler.meals if meal.date >= today]
+            crawled_index = None
+            with metrics.timer("stage_seconds", stage="restaurants_transaction"):
+                restaurants = await pool.transaction(
+                    lambda cursor: restaurants_transaction(crawled_meals, cursor, notifier, db_state["restaurants"])
+                )
+        await sync_menus(
+            pool,
+            notifier,
+            crawled_meals,
+            get_sync_scopes(crawlers, today),
+            fingerprints,
+            snapshot,
+            reconcile,
+            restaurants,
+            db_state["menus"],
+            crawled_index,
+        )
+    except BaseException:
+        # DB에 반영하지 못한 페이지의 해시는 저장하지 않는다
+        if fingerprints is not None:
+            fingerprints.discard()
+        raise
+    finally:
+        if snapshot is not None:
+            snapshot.close()
+
+
+def crawl(event, context):
+    pool = create_db_pool()
+    notifier = SlackNotifier()
+    metrics.reset()
+    set_run_clock()
     try:
         print("Start crawling")
-        crawlers = [VetRestaurantCrawler(), SnudormRestaurantCrawler(), SnucoRestaurantCrawler()]
-        results = asyncio.run(run_crawlers(crawlers))
-        for result in results:
-            for err in result:
-                if err is not None:
-                    raise err
-        crawled_meals = []
-        for crawler in crawlers:
-            crawled_meals = crawled_meals + crawler.meals
-
-        today = datetime.datetime.now(timezone("Asia/Seoul")).date()
-        crawled_meals = list(filter(lambda meal: meal.date >= today, crawled_meals))
-        restaurants_transaction(crawled_meals, cursor)
-        siksha_db.commit()
-        menus_transaction(crawled_meals, cursor)
-        siksha_db.commit()
-
-        _send_slack_message("Crawling has been successfully done")
+        # 크롤링과 DB 트랜잭션이 같은 이벤트 루프에서 돈다 (트랜잭션은 풀의 연결로 스레드에서 실행된다)
+        asyncio.run(crawl_and_sync(event, pool, notifier))
+        notifier.set_status("Crawling has been successfully done")
+        metrics.inc("runs_total", result="success")
         return "Crawling has been successfully done"
     except Exception as e:
-        siksha_db.rollback()
+        metrics.inc("runs_total", result="failure")
         print(e)
-        _send_slack_message(f"Crawling has been failed: {str(e)}")
+        notifier.set_status(f"Crawling has been failed: {str(e)}")
         return "Crawling has been failed"
     finally:
-        cursor.close()
-        siksha_db.close()
+        pool.close()
+        metrics.export()
+        # DB 연결을 닫은 뒤에 요약 메시지를 보내고, Slack이 느려도 정해진 시간 이상 기다리지 않는다
+        notifier.flush()
+        notifier.wait()
+
+
+async def poll_crawlers(jobs, client, pool, state):
+    # jobs: {크롤러 클래스: 날짜 목록}. 받은 날짜 중 페이지가 바뀐 (식당, 날짜)만 DB에 반영한다.
+    metrics.reset()
+    clock = set_run_clock()
+    crawlers = create_crawlers(list(jobs), state["menucost_cache"])
+    attach_crawlers(crawlers, client, state["fingerprints"], state["executor"])
+    notifier = SlackNotifier()
+    failed = False
+    with metrics.timer("stage_seconds", stage="crawl"):
+        results = await asyncio.gather(
+            *(crawler.run_dates(jobs[type(crawler)]) for crawler in crawlers), return_exceptions=True
+        )
+    try:
+        raise_crawler_errors(results)
+        crawled_meals = [meal for crawler in crawlers for meal in crawler.meals if meal.date >= clock.today]
+        scopes = get_sync_scopes(crawlers, clock.today)
+        if scopes:
+            with metrics.timer("stage_seconds", stage="restaurants_transaction"):
+                restaurants = await pool.transaction(
+                    lambda cursor: restaurants_transaction(crawled_meals, cursor, notifier)
+                )
+            await sync_menus(
+                pool, notifier, crawled_meals, scopes, state["fingerprints"], state["snapshot"], restaurants=restaurants
+            )
+        else:
+            state["fingerprints"].commit()
+        metrics.inc("runs_total", result="success")
+    except Exception as e:
+        metrics.inc("runs_total", result="failure")
+        print(e)
+        # 이번 폴링에서 본 페이지는 다음 폴링에서 다시 DB와 비교해야 한다 (다음 commit()에 섞이지 않게 버린다)
+        state["fingerprints"].discard()
+        notifier.set_status(f"Polling {', '.join(cls.__name__ for cls in jobs)} has been failed: {str(e)}")
+        failed = True
+    finally:
+        metrics.export()
+        if failed or notifier.changed:
+            notifier.flush()
+
+
+async def run_daemon():
+    # 크론잡 대신 계속 떠 있으면서 세션, DB 연결 풀, 프로세스 풀을 재사용하고 크롤러마다 날짜 구간별 주기로 폴링한다
+    schedule = PollSchedule(crawler_classes())
+    state = dict(
+        # 바뀌지 않은 페이지는 파싱하지도 DB와 비교하지도 않는다 (CRAWLER_CACHE_DIR이 없으면 메모리에만 둔다)
+        fingerprints=create_fingerprint_store() or FingerprintStore(),
+        snapshot=create_menu_snapshot(),
+        menucost_cache=create_menucost_cache(),
+        executor=create_parse_executor(),
+    )
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    pool = create_db_pool()
+    try:
+        async with open_http_client() as client:
+            while not stop.is_set():
+                now = datetime.datetime.now(RunClock.tz)
+                jobs = schedule.take_due(now)
+                if jobs:
+                    print(f"Polling {', '.join(f'{cls.__name__}({len(dates)} dates)' for cls, dates in jobs.items())}")
+                    await poll_crawlers(jobs, client, pool, state)
+                    now = datetime.datetime.now(RunClock.tz)
+                try:
+                    await asyncio.wait_for(stop.wait(), schedule.seconds_until_next(now))
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        pool.close()
+        if state["snapshot"] is not None:
+            state["snapshot"].close()
+        if state["executor"] is not None:
+            state["executor"].shutdown()
+
+
+def daemon(event=None, context=None):
+    asyncio.run(run_daemon())
 
 
 if __name__ == "__main__":
@@ -223,9 +708,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="debug option")
     parser.add_argument("--restaurant", "-r", help="어떤 식당? 예시)자하연")
     parser.add_argument("--date", "-d", help="언제? 예시)20221012")
+    parser.add_argument("--record", metavar="DIR", help="받은 페이지를 DIR에 저장한다 (--replay로 다시 쓸 수 있다)")
+    parser.add_argument("--replay", metavar="DIR", help="네트워크 대신 --record로 저장한 페이지를 쓴다")
+    parser.add_argument("--reconcile", action="store_true", help="메뉴 스냅샷을 MySQL 전체와 다시 맞춘다")
+    parser.add_argument("--daemon", action="store_true", help="종료하지 않고 크롤러마다 정해진 주기로 폴링한다")
     args = parser.parse_args()
 
     if args.restaurant is not None:
-        crawl_debug(restaurant=args.restaurant, date=args.date)
+        crawl_debug(restaurant=args.restaurant, date=args.date, record=args.record, replay=args.replay)
+    elif args.daemon:
+        daemon()
     else:
-        crawl(None, None)
+        crawl({"reconcile": args.reconcile}, None)
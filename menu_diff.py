@@ -0,0 +1,41 @@
+UNIQUE_FIELDS = ("restaurant_id", "code", "date", "type")
+DETAIL_FIELDS = ("price", "etc")
+
+
+def menu_key(menu):
+    return tuple(menu.get(field) for field in UNIQUE_FIELDS)
+
+
+def index_menus(menus):
+    # key가 같은 메뉴가 여러 개면 먼저 나온 것만 남긴다
+    index = {}
+    for menu in menus:
+        index.setdefault(menu_key(menu), menu)
+    return index
+
+
+def diff_menus(db_menus, crawled_index):
+    """DB 메뉴와 (menu_key로 색인된) 크롤링 메뉴를 비교해 (new, deleted, edited)를 돌려준다.
+
+    edited 메뉴는 바뀐 필드를 크롤링 값으로 덮어쓰고, 이전 값은 previous_{field}에 남긴다.
+    """
+    matched_keys = set()
+    deleted_menus = []
+    edited_menus = []
+    for db_menu in db_menus:
+        key = menu_key(db_menu)
+        crawled_menu = crawled_index.get(key)
+        if crawled_menu is None:
+            deleted_menus.append(db_menu)
+            continue
+        matched_keys.add(key)
+        edited = False
+        for field in DETAIL_FIELDS:
+            if db_menu.get(field) != crawled_menu.get(field):
+                edited = True
+                db_menu["previous_" + field] = db_menu.pop(field, None)
+                db_menu[field] = crawled_menu.get(field)
+        if edited:
+            edited_menus.append(db_menu)
+    new_menus = [menu for key, menu in crawled_index.items() if key not in matched_keys]
+    return new_menus, deleted_menus, edited_menus
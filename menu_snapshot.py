@@ -0,0 +1,110 @@
+import datetime
+import sqlite3
+import time
+
+MENU_COLUMNS = ("id", "restaurant_id", "code", "date", "type", "price", "etc", "name_kr")
+
+
+class MenuSnapshot:
+    """마지막으로 DB에 반영한 메뉴(id 포함)를 로컬 SQLite에 저장해, 평소에는 MySQL 대신 이것과 비교한다.
+
+    stage()로 이번 동기화 결과를 기록하고, MySQL commit이 끝난 뒤 commit()해야 다음 실행에서 쓸 수 있다.
+    그 사이에 실패하면 다음 실행은 reconcile(MySQL 전체 조회)로 스냅샷을 다시 만든다.
+    """
+
+    def __init__(self, path, reconcile_interval=datetime.timedelta(hours=24)):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        # 메뉴 트랜잭션이 DB 풀의 스레드에서 실행되므로 다른 스레드에서도 쓴다 (한 번에 한 트랜잭션만 쓴다)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS menu(
+                id INTEGER PRIMARY KEY, restaurant_id INTEGER, code TEXT, date TEXT, type TEXT,
+                price INTEGER, etc TEXT, name_kr TEXT
+            );
+            CREATE INDEX IF NOT EXISTS menu_restaurant_id_date ON menu(restaurant_id, date);
+            CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value REAL);
+            """)
+        self.staged = None
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, value))
+
+    def needs_reconcile(self):
+        # 한 번도 MySQL과 맞춰 본 적 없거나, 지난 동기화가 commit되지 않았거나, 맞춘 지 오래되었으면 MySQL에서 다시 읽는다
+        reconciled_at = self._meta("reconciled_at")
+        if reconciled_at is None or self._meta("pending"):
+            return True
+        return time.time() - reconciled_at >= self.reconcile_interval.total_seconds()
+
+    @staticmethod
+    def _menu(row):
+        menu = dict(zip(MENU_COLUMNS, row))
+        menu["date"] = datetime.date.fromisoformat(menu["date"])
+        return menu
+
+    def fetch_menus(self, today, scopes=None):
+        # scopes: (restaurant_id, 날짜) 쌍. 없으면 today 이후 전체
+        rows = self.db.execute(
+            f"SELECT {', '.join(MENU_COLUMNS)} FROM menu WHERE date>=?", (today.isoformat(),)
+        ).fetchall()
+        menus = [self._menu(row) for row in rows]
+        if scopes is not None:
+            menus = [menu for menu in menus if (menu["restaurant_id"], menu["date"]) in scopes]
+        return menus
+
+    def drift(self, db_menus, today):
+        # reconcile할 때 스냅샷과 MySQL이 얼마나 달랐는지 센다 (한쪽에만 있거나 값이 다른 메뉴 수)
+        snapshot = {menu["id"]: menu for menu in self.fetch_menus(today)}
+        drifted = 0
+        for db_menu in db_menus:
+            menu = snapshot.pop(db_menu.get("id"), None)
+            if menu is None or any(menu[column] != db_menu.get(column) for column in MENU_COLUMNS):
+                drifted += 1
+        return drifted + len(snapshot)
+
+    def stage(self, menus, today, scopes=None, reconciled=False):
+        # menus: 동기화가 끝난 뒤 scopes(없으면 today 이후 전체)에 있어야 하는 메뉴 (id 포함)
+        self.staged = (menus, today, scopes, reconciled)
+        self._set_meta("pending", 1)
+        self.db.commit()
+
+    def commit(self):
+        if self.staged is None:
+            return
+        menus, today, scopes, reconciled = self.staged
+        self.staged = None
+        self.db.execute("DELETE FROM menu WHERE date<?", (today.isoformat(),))
+        if scopes is None:
+            self.db.execute("DELETE FROM menu")
+        else:
+            self.db.executemany(
+                "DELETE FROM menu WHERE restaurant_id=? AND date=?",
+                [(restaurant_id, date.isoformat()) for restaurant_id, date in scopes],
+            )
+        self.db.executemany(
+            f"INSERT OR REPLACE INTO menu({', '.join(MENU_COLUMNS)}) VALUES ({', '.join(['?'] * len(MENU_COLUMNS))})",
+            [
+                tuple(menu["date"].isoformat() if column == "date" else menu.get(column) for column in MENU_COLUMNS)
+                for menu in menus
+            ],
+        )
+        if reconciled:
+            self._set_meta("reconciled_at", time.time())
+        self._set_meta("synced_at", time.time())
+        self._set_meta("pending", 0)
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+def synced_menus(db_menus, new_menus, deleted_menus):
+    # diff_menus 이후의 DB 상태: 지운 메뉴를 빼고 새 메뉴를 더한다 (수정된 메뉴는 db_menus에 이미 반영되어 있다)
+    deleted_ids = {menu.get("id") for menu in deleted_menus}
+    menus = [menu for menu in db_menus if menu.get("id") not in deleted_ids]
+    return menus + [menu for menu in new_menus if menu.get("id") is not None]
@@ -0,0 +1,46 @@
+class RestaurantRegistry:
+    """DB 식당 목록. 크롤링한 식당 이름은 이름마다 한 번만 정규화하고, code -> id는 dict로 찾는다.
+
+    새로 넣은 식당은 add()로 id(lastrowid)와 함께 더하므로 식당 목록을 다시 읽지 않아도 된다.
+    """
+
+    def __init__(self, restaurants=()):
+        # restaurants: DB의 식당 (id, code) 목록
+        self.ids = {restaurant.get("code"): restaurant.get("id") for restaurant in restaurants}
+        # 식당 이름 -> code
+        self.codes = {}
+
+    def __contains__(self, code):
+        return code in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def code_of(self, meal):
+        code = self.codes.get(meal.restaurant)
+        if code is None:
+            code = self.codes[meal.restaurant] = meal.restaurant_code
+        return code
+
+    def id_of(self, meal):
+        return self.ids.get(self.code_of(meal))
+
+    def find_new(self, meals):
+        # 등록되지 않은 식당을 처음 나온 이름으로 한 번씩 돌려준다 (아직 등록하지는 않는다)
+        new_restaurants = {}
+        names = set()
+        for meal in meals:
+            if meal.restaurant in names:
+                continue
+            names.add(meal.restaurant)
+            code = self.code_of(meal)
+            if code not in self.ids and code not in new_restaurants:
+                new_restaurants[code] = dict(code=code, name_kr=meal.restaurant)
+        return list(new_restaurants.values())
+
+    def add(self, restaurant):
+        self.ids[restaurant.get("code")] = restaurant.get("id")
+
+    def scope_ids(self, scopes):
+        # (식당 code, 날짜) -> (restaurant_id, 날짜). 등록되지 않은 식당은 뺀다.
+        return {(self.ids[code], date) for code, date in scopes if code in self.ids}
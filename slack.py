@@ -1,53 +1,112 @@
 import os
+import threading
+import time
 
-import requests
+# Slack은 text를 40,000자까지 받지만 4,000자가 넘으면 잘라서 보여주므로 그보다 작게 나눠 보낸다
+MAX_MESSAGE_LENGTH = 3500
 
 
-def _send_slack_message(message: str):
+def _send_slack_message(message: str, timeout=10, retries=3):
     slack_token = os.environ.get("SLACK_TOKEN")
-    slack_channel = os.environ["SLACK_CHANNEL"]
+    slack_channel = os.environ.get("SLACK_CHANNEL")
     if not slack_token:
         print("No Slack token provided. Skipping sending message.")
-        return
+        return False
+    # requests는 메시지를 실제로 보낼 때만 불러온다 (import가 무거워 시작 시간을 늘린다)
+    import requests  # pylint: disable=import-outside-toplevel
+
     body = {"channel": slack_channel, "text": message}
     headers = {"Authorization": f"Bearer {slack_token}"}
-    try:
-        res = requests.post("https://slack.com/api/chat.postMessage", headers=headers, data=body, timeout=100)
-        res.raise_for_status()
-    except Exception as e:
-        print(f"Failed to send Slack message: {str(e)}")
-        print(f"Response: {e.response.text if e.response else 'No response'}")
+    for attempt in range(retries):
+        try:
+            res = requests.post("https://slack.com/api/chat.postMessage", headers=headers, data=body, timeout=timeout)
+            res.raise_for_status()
+            return True
+        except Exception as e:
+            response = getattr(e, "response", None)
+            print(f"Failed to send Slack message: {str(e)}")
+            print(f"Response: {response.text if response is not None else 'No response'}")
+            if attempt + 1 < retries:
+                time.sleep(2**attempt)
+    return False
 
 
-def send_deleted_menus_message(menus: list):
-    message = f"{len(menus)} menus deleted: \n" + build_body_message(menus)
-    _send_slack_message(message)
-    print(f"Menus deleted: {repr(menus)})")
+def build_body_message(menus_or_restaurants: list):
+    return "".join(
+        f'"{menu_or_restaurant.get("name_kr")}", ' + ("\n" if i % 5 == 4 else "")
+        for i, menu_or_restaurant in enumerate(menus_or_restaurants)
+    )
 
 
-def send_new_menus_message(menus: list):
-    message = f"{len(menus)} new menus found: \n" + build_body_message(menus)
-    _send_slack_message(message)
-    print(f"New menus found: {repr(menus)})")
+def split_message(message: str, max_length=MAX_MESSAGE_LENGTH):
+    chunks = []
+    current = ""
+    for line in message.splitlines(keepends=True):
+        while len(line) > max_length:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:max_length])
+            line = line[max_length:]
+        if len(current) + len(line) > max_length:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
 
 
-def send_edited_menus_message(menus: list):
-    message = f"{len(menus)} menus edited: \n" + build_body_message(menus)
-    _send_slack_message(message)
-    print(f"Menus edited: {repr(menus)})")
+class SlackNotifier:
+    """실행 중에 생긴 알림을 모아 두었다가, DB 작업이 끝난 뒤 하나의 요약 메시지로 보낸다."""
 
+    def __init__(self):
+        self.status = None
+        self.sections = []
+        self.thread = None
+        # 새 식당이나 메뉴 변경이 하나라도 있었는지 (데몬 모드는 변경이 있을 때만 보낸다)
+        self.changed = False
 
-def send_new_restaurants_message(restaurants: list):
-    slack_message = f"{len(restaurants)} new restaurants found: \n" + build_body_message(restaurants)
-    if restaurants:
-        _send_slack_message(slack_message)
-    print(f"New restaurants: {repr(restaurants)}")
+    def add_new_restaurants(self, restaurants: list):
+        if restaurants:
+            self.changed = True
+            self.sections.append(f"{len(restaurants)} new restaurants found: \n" + build_body_message(restaurants))
+        print(f"New restaurants: {repr(restaurants)}")
 
+    def add_deleted_menus(self, menus: list):
+        self.changed = self.changed or bool(menus)
+        self.sections.append(f"{len(menus)} menus deleted: \n" + build_body_message(menus))
+        print(f"Menus deleted: {repr(menus)})")
 
-def build_body_message(menus_or_restaurants: list):
-    body_message = ""
-    for i, menu_or_restaurant in enumerate(menus_or_restaurants):
-        body_message += f'"{menu_or_restaurant.get("name_kr")}", '
-        if i % 5 == 4:
-            body_message += "\n"
-    return body_message
+    def add_new_menus(self, menus: list):
+        self.changed = self.changed or bool(menus)
+        self.sections.append(f"{len(menus)} new menus found: \n" + build_body_message(menus))
+        print(f"New menus found: {repr(menus)})")
+
+    def add_edited_menus(self, menus: list):
+        self.changed = self.changed or bool(menus)
+        self.sections.append(f"{len(menus)} menus edited: \n" + build_body_message(menus))
+        print(f"Menus edited: {repr(menus)})")
+
+    def set_status(self, message: str):
+        self.status = message
+
+    def build_messages(self):
+        parts = ([self.status] if self.status else []) + self.sections
+        return split_message("\n".join(part.rstrip("\n") for part in parts))
+
+    def flush(self):
+        # 느린 Slack API가 크롤링을 붙잡지 않도록 별도 스레드에서 보낸다
+        messages = self.build_messages()
+        self.sections = []
+        self.thread = threading.Thread(target=self._send, args=(messages,), daemon=True)
+        self.thread.start()
+
+    def wait(self, timeout=30):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    @staticmethod
+    def _send(messages):
+        for message in messages:
+            _send_slack_message(message)
@@ -0,0 +1,114 @@
+"""테스트용 로컬 DB. pymysql(DictCursor) 대신 SQLite 파일에 같은 쿼리를 실행한다.
+
+%s, %(name)s 자리표시자와 ON DUPLICATE KEY UPDATE를 SQLite 문법으로 바꾸고, 행은 dict로 돌려준다.
+같은 경로로 만든 연결은 같은 DB를 보므로 DbPool에 connect로 넘길 수 있다.
+"""
+
+import datetime
+import re
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS restaurant(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    code TEXT UNIQUE,
+    name_kr TEXT
+);
+CREATE TABLE IF NOT EXISTS menu(
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    restaurant_id INTEGER,
+    code TEXT,
+    date DATE,
+    type TEXT,
+    name_kr TEXT,
+    price INTEGER,
+    etc TEXT,
+    UNIQUE(restaurant_id, code, date, type)
+);
+CREATE INDEX IF NOT EXISTS menu_restaurant_id_date ON menu(restaurant_id, date);
+"""
+
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_converter("DATE", lambda value: datetime.date.fromisoformat(value.decode()))
+
+
+def to_sqlite(query):
+    query = re.sub(r"%\((\w+)\)s", r":\1", query).replace("%s", "?")
+    # menu의 unique key (restaurant_id, code, date, type)에 대한 upsert
+    return re.sub(
+        r"ON DUPLICATE KEY UPDATE (.*?);",
+        lambda match: "ON CONFLICT(restaurant_id, code, date, type) DO UPDATE SET "
+        + re.sub(r"VALUES\((\w+)\)", r"excluded.\1", match.group(1))
+        + ";",
+        query,
+        flags=re.S,
+    )
+
+
+class LocalCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+        self.lastrowid = None
+        self.rowcount = -1
+
+    def execute(self, query, args=None):
+        self.connection.queries.append(query.split()[0].upper())
+        self.cursor.execute(to_sqlite(query), args if args is not None else ())
+        self.lastrowid = self.cursor.lastrowid
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def executemany(self, query, args):
+        self.connection.queries.append(query.split()[0].upper())
+        self.cursor.executemany(to_sqlite(query), list(args))
+        self.rowcount = self.cursor.rowcount
+        return self.rowcount
+
+    def _row(self, row):
+        return dict(zip((column[0] for column in self.cursor.description), row))
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        return None if row is None else self._row(row)
+
+    def fetchall(self):
+        return [self._row(row) for row in self.cursor.fetchall()]
+
+    def close(self):
+        self.cursor.close()
+
+
+class LocalConnection:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # 실행한 문장 종류 (SELECT, INSERT, ...)
+        self.queries = []
+
+    def cursor(self):
+        return LocalCursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.db.close()
+
+
+def connect(path):
+    return LocalConnection(path)
+
+
+def query(path, sql, args=()):
+    # 테스트에서 DB 상태를 확인할 때 쓴다
+    connection = connect(path)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(sql, args)
+        return cursor.fetchall()
+    finally:
+        connection.close()
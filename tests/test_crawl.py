@@ -0,0 +1,128 @@
+import datetime
+import os
+import unittest
+from unittest import mock
+
+import handler
+from crawlers.snuco_crawler import SnucoRestaurantCrawler
+from tests.support import FixtureCrawlTestCase
+
+MAY_14 = datetime.date(2024, 5, 14)
+
+# id 대신 식당 code로 비교한다 (id는 넣은 순서에 따라 다르다)
+MENU_ROWS_QUERY = """
+    SELECT r.code AS restaurant, m.code, m.date, m.type, m.name_kr, m.price, m.etc
+    FROM menu m JOIN restaurant r ON r.id=m.restaurant_id
+    ORDER BY r.code, m.date, m.type, m.code;
+"""
+
+
+class CrawlTest(FixtureCrawlTestCase):
+    def add_menu(self, restaurant_code, date, name):
+        connection = self.connect()
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO restaurant(code, name_kr) VALUES (%s, %s) ON CONFLICT DO NOTHING;", [restaurant_code] * 2
+        )
+        cursor.execute("SELECT id FROM restaurant WHERE code=%s;", [restaurant_code])
+        restaurant_id = cursor.fetchone()["id"]
+        cursor.execute(
+            "INSERT INTO menu(restaurant_id, code, date, type, name_kr) VALUES (%s, %s, %s, 'LU', %s);",
+            [restaurant_id, name, date, name],
+        )
+        connection.commit()
+        connection.close()
+
+    def menu_rows(self):
+        return self.query(MENU_ROWS_QUERY)
+
+    def menu_names(self):
+        return {menu["name_kr"] for menu in self.menus()}
+
+    def crawl_with_stale_menus(self):
+        handler.crawl(None, None)
+        # 페이지에서 사라진 메뉴, 크롤링 기간 밖의 메뉴, 다른 식당의 메뉴
+        self.add_menu("학생회관식당", MAY_14, "사라진 메뉴")
+        self.add_menu("학생회관식당", datetime.date(2024, 7, 1), "다음 학기 메뉴")
+        self.add_menu("다른식당", MAY_14, "다른 식당 메뉴")
+        with (
+            mock.patch.object(handler, "fetch_future_menus", wraps=handler.fetch_future_menus) as fetch_future_menus,
+            mock.patch.object(handler, "fetch_scoped_menus", wraps=handler.fetch_scoped_menus) as fetch_scoped_menus,
+        ):
+            self.assertEqual(handler.crawl(None, None), "Crawling has been successfully done")
+        # 오늘 이후 메뉴 전체는 읽지 않는다
+        fetch_future_menus.assert_not_called()
+        # diff 직전에 더 읽은 (식당, 날짜)
+        return {scope for call in fetch_scoped_menus.call_args_list for scope in call.args[1]}
+
+    def test_crawl_inserts_menus(self):
+        self.assertEqual(handler.crawl(None, None), "Crawling has been successfully done")
+
+        menus = self.menus()
+        self.assertTrue(menus)
+        self.assertTrue(all(menu["date"] >= datetime.date(2024, 5, 13) for menu in menus))
+        restaurant_ids = {row["id"] for row in self.query("SELECT id FROM restaurant")}
+        self.assertEqual({menu["restaurant_id"] for menu in menus}, restaurant_ids)
+        self.assertTrue(self.menus(MAY_14))
+
+    def test_crawl_again_keeps_menus(self):
+        handler.crawl(None, None)
+        menus = self.menus()
+        self.assertEqual(handler.crawl(None, None), "Crawling has been successfully done")
+        self.assertEqual(self.menus(), menus)
+
+    def test_crawl_reads_menus_after_holiday(self):
+        # 일주일 넘게 식단이 없는 연휴 뒤에 올라온 식단도 받는다
+        self.pages["snuco"]["2024-05-24"] = self.pages["snuco"]["2024-05-14"]
+        handler.crawl(None, None)
+        self.assertTrue(self.menus(datetime.date(2024, 5, 24)))
+
+    def test_snudorm_fetches_every_week(self):
+        handler.crawl(None, None)
+        weeks = [
+            data["start_week_date"]
+            for crawler, _, data in self.fetched
+            if crawler == "SnudormRestaurantCrawler" and data
+        ]
+        self.assertEqual(weeks, ["2024-05-13", "2024-05-20", "2024-05-27", "2024-06-03"])
+
+    def test_stream_mode_matches_batch(self):
+        handler.crawl(None, None)
+        menus = self.menus()
+        self.add_menu("학생회관식당", MAY_14, "사라진 메뉴")
+        with mock.patch.dict(os.environ, {"CRAWL_MODE": "stream"}):
+            with mock.patch.object(handler, "index_menus", wraps=handler.index_menus) as index_menus:
+                self.assertEqual(handler.crawl(None, None), "Crawling has been successfully done")
+        # 크롤링하는 동안 만든 색인을 diff에 쓴다
+        index_menus.assert_not_called()
+        self.assertEqual(self.menus(), menus)
+
+    def test_stream_mode_inserts_new_restaurants(self):
+        with mock.patch.dict(os.environ, {"CRAWL_MODE": "stream"}):
+            self.assertEqual(handler.crawl(None, None), "Crawling has been successfully done")
+        stream_menus = self.menu_rows()
+        # 같은 페이지를 배치 모드로 빈 DB에 넣은 결과와 같다
+        self.db_path += ".batch"
+        handler.crawl(None, None)
+        self.assertEqual(stream_menus, self.menu_rows())
+
+    def test_crawl_prefetches_only_crawled_restaurants(self):
+        # 크롤러가 맡은 식당의 메뉴는 모두 미리 읽어 두었다
+        self.assertEqual(self.crawl_with_stale_menus(), set())
+        names = self.menu_names()
+        self.assertNotIn("사라진 메뉴", names)
+        self.assertIn("다음 학기 메뉴", names)
+        self.assertIn("다른 식당 메뉴", names)
+
+    def test_crawl_reads_scopes_outside_prefetch(self):
+        # restaurant_names에 없는 식당이 페이지에 나오면 그 (식당, 날짜)는 diff 직전에 읽는다
+        with mock.patch.object(SnucoRestaurantCrawler, "restaurant_codes", frozenset()):
+            self.assertTrue(self.crawl_with_stale_menus())
+        names = self.menu_names()
+        self.assertNotIn("사라진 메뉴", names)
+        self.assertIn("다음 학기 메뉴", names)
+        self.assertIn("다른 식당 메뉴", names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+import time
+import unittest
+
+from crawlers.http_cache import HttpCache
+
+URL = "https://snuco.snu.ac.kr/foodmenu/?date=2024-05-14"
+
+
+class HttpCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.key = HttpCache.key("GET", URL)
+
+    def age(self, cache, key, days):
+        path = cache._path(key, "json")  # pylint: disable=protected-access
+        mtime = time.time() - days * 24 * 60 * 60
+        os.utime(path, (mtime, mtime))
+
+    def test_store_needs_validator(self):
+        cache = HttpCache(self.directory)
+        cache.store(self.key, URL, {}, b"no validator")
+        self.assertIsNone(cache.load(self.key))
+
+        cache.store(self.key, URL, {"ETag": '"v1"'}, b"etag")
+        self.assertEqual(cache.load(self.key).validators(), {"If-None-Match": '"v1"'})
+
+    def test_record_stores_every_response(self):
+        cache = HttpCache(self.directory, record=True)
+        cache.store(self.key, URL, {}, b"no validator")
+        self.assertEqual(cache.load(self.key).body, b"no validator")
+
+    def test_prune_removes_old_responses(self):
+        cache = HttpCache(self.directory)
+        old_key = HttpCache.key("GET", URL.replace("14", "07"))
+        cache.store(self.key, URL, {"Last-Modified": "Mon, 13 May 2024 00:00:00 GMT"}, b"new")
+        cache.store(old_key, URL, {"Last-Modified": "Mon, 06 May 2024 00:00:00 GMT"}, b"old")
+        self.age(cache, old_key, 8)
+
+        self.assertEqual(cache.maybe_prune(), 1)
+        self.assertIsNone(cache.load(old_key))
+        self.assertEqual(cache.load(self.key).body, b"new")
+        self.assertEqual(sorted(os.listdir(self.directory)), [f"{self.key}.body", f"{self.key}.json"])
+
+    def test_touch_keeps_revalidated_response(self):
+        cache = HttpCache(self.directory)
+        cache.store(self.key, URL, {"ETag": '"v1"'}, b"body")
+        self.age(cache, self.key, 8)
+        cache.touch(self.key)
+        self.assertEqual(cache.prune(), 0)
+
+    def test_maybe_prune_once_per_interval(self):
+        cache = HttpCache(self.directory)
+        self.assertEqual(cache.maybe_prune(), 0)
+        cache.store(self.key, URL, {"ETag": '"v1"'}, b"body")
+        self.age(cache, self.key, 8)
+        self.assertEqual(cache.maybe_prune(), 0)
+        self.assertEqual(cache.prune(), 1)
+
+    def test_recorded_responses_are_not_pruned(self):
+        cache = HttpCache(self.directory, record=True)
+        cache.store(self.key, URL, {}, b"recorded")
+        self.age(cache, self.key, 30)
+        self.assertEqual(cache.maybe_prune(), 0)
+        self.assertEqual(cache.load(self.key).body, b"recorded")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import datetime
+import unittest
+
+from bs4 import BeautifulSoup
+
+from crawlers.base_crawler import Meal, NormalizerPipeline, new_crawl_stats, text_normalizer
+from crawlers.snuco_crawler import SnucoRestaurantCrawler
+from crawlers.snudorm_crawler import SnudormRestaurantCrawler
+from crawlers.vet_crawler import VetRestaurantCrawler
+
+# 단계마다 정규화하던 기존 normalizer 결과 (크롤러, 식당, 원래 이름) -> (식당, 이름, 가격, etc)
+PIPELINE_GOLDEN = [
+    (SnucoRestaurantCrawler, "학생회관식당", "(#) 비빔밥 5,000원", ("학생회관식당", "비빔밥", 5000, ["No meat"])),
+    # 가격을 지운 뒤 남은 ":"는 FindParenthesisHash 전에 지워진다
+    (SnucoRestaurantCrawler, "학생회관식당", "< 채식뷔페 >: 5000원", ("학생회관식당", "< 채식뷔페 >", 5000, [])),
+    (
+        SnucoRestaurantCrawler,
+        "학생회관식당",
+        "< 채식뷔페 >: 샐러드 5,500원",
+        ("학생회관식당", "< 채식뷔페 >: 샐러드", 5500, ["No meat"]),
+    ),
+    # 앞뒤 공백을 지운 뒤 ":"를 지우므로 그 앞의 공백은 남는다
+    (SnucoRestaurantCrawler, "학생회관식당", "라면 : 3000원 ※ 품절", ("학생회관식당", "라면 ", 3000, [])),
+    (SnucoRestaurantCrawler, "자하연식당", "(2층): 비빔밥 ①", ("자하연식당>2층", "비빔밥", None, [])),
+    (SnudormRestaurantCrawler, "기숙사식당", "[#] 비빔밥 4,000원", ("기숙사식당>919동", "비빔밥", 4000, ["No meat"])),
+    (SnudormRestaurantCrawler, "기숙사식당", "< 채식뷔페 >:5,500원", ("기숙사식당>919동", "< 채식뷔페 >", 5500, [])),
+    (VetRestaurantCrawler, "수의대식당", "(#): 비빔밥", ("수의대식당", "(#): 비빔밥", None, [])),
+]
+
+SNUCO_TABLE = """<table class="menu-table"><tbody>
+<tr><td class="title">학생회관식당(880-5543)</td><td class="dinner">셀프코너
+닭강정
+떡볶이
+&lt;주문식 메뉴&gt;
+</td></tr>
+<tr><td class="title">220동식당(887-1123)</td><td class="lunch">ㅁ 바비든든( ~ ): 덮밥류 7,500원
+주문식메뉴ㅁ ► 안내
+</td></tr>
+</tbody></table>"""
+
+SNUCO_GOLDEN = [
+    ("학생회관식당", "셀프코너: 닭강정+떡볶이+<주문식 메뉴>", "DN", None, []),
+    ("220동식당", "바비든든: 덮밥류", "LU", 7500, []),
+    ("220동식당", "주문식메뉴ㅁ", "LU", None, []),
+]
+
+
+class NormalizerTest(unittest.TestCase):
+    def normalize(self, crawler_cls, restaurant, name, **kwargs):
+        pipeline = NormalizerPipeline(crawler_cls.normalizer_classes)
+        return pipeline.normalize(Meal(restaurant, name, "05/14", "LU"), **kwargs)
+
+    def test_text_normalizer_strips_unicode_spaces(self):
+        self.assertEqual(text_normalizer("\u3000아침\u3000"), "아침")
+        self.assertEqual(text_normalizer("\u2003비빔밥:\u2003"), "비빔밥")
+        self.assertEqual(text_normalizer("\u3000비빔밥 \u2003", True), "비빔밥")
+        self.assertEqual(Meal.type_handler.get(text_normalizer("\u3000중식\u2003")), Meal.LU)
+
+    def test_pipeline_golden(self):
+        for crawler_cls, restaurant, name, expected in PIPELINE_GOLDEN:
+            with self.subTest(name=name):
+                meal = self.normalize(
+                    crawler_cls, restaurant, name, restaurant_detail=["919동 ", "아워홈"], final_restaurants=["919동"]
+                )
+                self.assertEqual((meal.restaurant, meal.name, meal.price, meal.etc), expected)
+
+    def test_snuco_crawl_golden(self):
+        crawler = SnucoRestaurantCrawler()
+        crawler.stats = new_crawl_stats()
+        crawler.crawl(BeautifulSoup(SNUCO_TABLE, "html.parser"), date=datetime.date(2024, 5, 14))
+        meals = [(meal.restaurant, meal.name, meal.type, meal.price, meal.etc) for meal in crawler.meals]
+        self.assertEqual(meals, SNUCO_GOLDEN)
+
+    def test_unchanged_meal_keeps_code(self):
+        meal = self.normalize(SnucoRestaurantCrawler, "학생회관식당", "비빔밥")
+        self.assertEqual((meal.name, meal.code), ("비빔밥", "비빔밥"))
+
+
+if __name__ == "__main__":
+    unittest.main()
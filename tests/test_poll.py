@@ -0,0 +1,56 @@
+import asyncio
+import datetime
+import unittest
+from unittest import mock
+
+import handler
+from crawlers.fingerprint import FingerprintStore
+from crawlers.menucost_cache import MenuCostCache
+from crawlers.snuco_crawler import SnucoRestaurantCrawler
+from db_pool import DbPool
+from tests.support import FixtureCrawlTestCase
+
+MAY_14 = datetime.date(2024, 5, 14)
+MAY_15 = datetime.date(2024, 5, 15)
+
+
+class PollCrawlersTest(FixtureCrawlTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state = dict(fingerprints=FingerprintStore(), snapshot=None, menucost_cache=MenuCostCache(), executor=None)
+
+    async def poll(self, *jobs):
+        pool = DbPool(self.connect)
+        try:
+            for dates in jobs:
+                await handler.poll_crawlers({SnucoRestaurantCrawler: dates}, None, pool, self.state)
+        finally:
+            pool.close()
+
+    def test_failed_poll_is_synced_again(self):
+        menus_transaction = handler.menus_transaction
+        calls = []
+
+        def fail_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise RuntimeError("DB is down")
+            return menus_transaction(*args, **kwargs)
+
+        with mock.patch.object(handler, "menus_transaction", fail_once):
+            # 05-14 폴링의 DB 반영이 실패한 뒤 다른 날짜의 폴링이 성공해도, 05-14를 다시 받으면 DB에 반영해야 한다
+            asyncio.run(self.poll([MAY_14], [MAY_15], [MAY_14]))
+
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(self.menus(MAY_14))
+        self.assertEqual(self.state["fingerprints"].pending, {})
+
+    def test_unchanged_page_is_not_synced_again(self):
+        with mock.patch.object(handler, "menus_transaction", wraps=handler.menus_transaction) as menus_transaction:
+            asyncio.run(self.poll([MAY_14], [MAY_14]))
+        self.assertEqual(menus_transaction.call_count, 1)
+        self.assertTrue(self.menus(MAY_14))
+
+
+if __name__ == "__main__":
+    unittest.main()